@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+# --- Бенчмарки Optimizer ---
+# Генерирует синтетические деревья твиков (заглушки на sh), работает без дисплея на Linux.
+#   python benchmarks/bench.py                       # 1k/10k/100k, сравнение с baseline.json
+#   python benchmarks/bench.py --sizes 1000,10000    # только указанные размеры
+#   python benchmarks/bench.py --save-baseline       # сохранить результаты как эталон
+# Каждый размер измеряется в отдельном процессе, чтобы пиковая память (RSS) считалась честно.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+BASELINE_FILE = os.path.join(HERE, "baseline.json")
+DEFAULT_SIZES = (1000, 10000, 100000)
+TOLERANCE = 0.25
+MIN_DELTA_MS = 1.0  # разница меньше миллисекунды - шум, а не регрессия
+EXTS = (".bat", ".cmd", ".ps1", ".reg", ".vbs")
+WORDS = ("reg add", "HKLM\\Software\\Policies", "DisableTelemetry", "sc config", "powercfg",
+         "Set-ItemProperty", "bcdedit", "netsh int tcp", "schtasks /change", "DisableAntiSpyware")
+QUERY = "disabletelemetry"
+LARGE_FILES = 5
+LARGE_FILE_BYTES = 5 * 1024 * 1024
+
+# Направление метрики: чем меньше, тем лучше (время, память) или чем больше (пропускная способность)
+HIGHER_IS_BETTER = ("lines_per_sec", "tweaks_per_sec")
+
+
+def _write_script(path, lines):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("#!/bin/sh\n")
+        f.write("\n".join(lines))
+        f.write("\n")
+    os.chmod(path, 0o755)
+
+
+def make_tree(root, n_files, seed=1):
+    # tweaks/c000/d1/.../f12/t123.bat; 10% файлов - в одной большой категории "big"
+    marker = os.path.join(root, ".complete")
+    if os.path.exists(marker):
+        return os.path.join(root, "tweaks")
+    rng = random.Random(seed)
+    tweaks_dir = os.path.join(root, "tweaks")
+    n_folders = max(10, n_files // 50)
+    folders = []
+    for i in range(n_folders):
+        depth = rng.randint(0, 5)
+        parts = [f"c{i % 40:03d}"] + [f"d{rng.randint(0, 3)}" for _ in range(depth)] + [f"f{i}"]
+        folders.append(os.path.join(tweaks_dir, *parts))
+    big = os.path.join(tweaks_dir, "big")
+    for folder in folders + [big]:
+        os.makedirs(folder, exist_ok=True)
+    for i in range(n_files):
+        folder = big if i % 10 == 0 else folders[rng.randrange(n_folders)]
+        lines = [f"echo {rng.choice(WORDS)} {rng.randint(0, 10 ** 6)}" for _ in range(rng.randint(5, 40))]
+        _write_script(os.path.join(folder, f"t{i}{rng.choice(EXTS)}"), lines)
+    line = "echo " + "x" * 70
+    for i in range(LARGE_FILES):
+        _write_script(os.path.join(big, f"large{i}.reg"), [line] * (LARGE_FILE_BYTES // (len(line) + 1)))
+    run_dir = os.path.join(root, "run")
+    os.makedirs(run_dir, exist_ok=True)
+    _write_script(os.path.join(run_dir, "verbose.bat"), ["seq 1 200000"])
+    for i in range(100):
+        _write_script(os.path.join(run_dir, f"quick{i}.reg"), ["echo ok"])
+    with open(marker, "w") as f:
+        f.write(str(n_files))
+    return tweaks_dir
+
+
+# --- Заглушки виджетов, если нет дисплея ---
+class StubTree:
+    def __init__(self):
+        self.children = []
+
+    def delete(self, *items):
+        gone = set(items)
+        self.children = [c for c in self.children if c not in gone]
+
+    def insert(self, parent, index, iid=None, values=(), tags=()):
+        self.children.append(iid)
+
+    def set_children(self, parent, *items):
+        self.children = list(items)
+
+
+class StubText:
+    def __init__(self):
+        self.size = 0
+
+    def after(self, ms, func):
+        pass
+
+    def configure(self, **kwargs):
+        pass
+
+    def insert(self, index, text):
+        self.size += len(text)
+
+    def delete(self, start, end):
+        pass
+
+    def see(self, index):
+        pass
+
+
+def open_widgets():
+    if not os.environ.get("DISPLAY") and os.name != "nt":
+        return None, StubTree(), StubText(), "stub"
+    try:
+        import tkinter
+        from tkinter import ttk
+        root = tkinter.Tk()
+        root.withdraw()
+        tree = ttk.Treeview(root, columns=("type", "name", "folder"), show="headings")
+        text = tkinter.Text(root)
+        return root, tree, text, "tk"
+    except Exception:
+        return None, StubTree(), StubText(), "stub"
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def run_case(n_files, workdir):
+    from catalog import CatalogIndex, TweakCatalog
+    from search import SearchIndex, MAX_HITS
+    from preview import PreviewLoader
+    from terminal import TerminalSink
+    from treesync import sync_tree_rows
+    from engine import BatchRunner, run_tweak
+    from catalog import Tweak
+    from core import SUPPORTED_EXTS, sort_tweaks
+
+    root = os.path.join(workdir, f"tree-{n_files}")
+    tweaks_dir = make_tree(root, n_files)
+    result = {}
+    tk_root, tree, text, widgets = open_widgets()
+    result["widgets"] = widgets
+
+    # --- Сканирование каталога ---
+    index_file = os.path.join(root, "index.json")
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    t = time.perf_counter()
+    by_folder = CatalogIndex(tweaks_dir, index_file, SUPPORTED_EXTS).update()
+    result["scan_cold_ms"] = _ms(time.perf_counter() - t)
+    t = time.perf_counter()
+    index = CatalogIndex(tweaks_dir, index_file, SUPPORTED_EXTS)
+    index.load()
+    by_folder = index.update()
+    result["scan_warm_ms"] = _ms(time.perf_counter() - t)
+    catalog = TweakCatalog(by_folder)
+
+    # --- Поиск: построение индекса, загрузка сохранённого и ввод запроса по одной букве ---
+    search_file = os.path.join(root, "search.bin")
+    if os.path.exists(search_file):
+        os.remove(search_file)
+    t = time.perf_counter()
+    SearchIndex(search_file).update(catalog.snapshot())
+    result["search_index_ms"] = _ms(time.perf_counter() - t)
+    search = SearchIndex(search_file)
+    t = time.perf_counter()
+    search.update(catalog.snapshot())
+    result["search_index_warm_ms"] = _ms(time.perf_counter() - t)
+
+    def make_row(tw):
+        return ("●", tw.name, tw.folder), ("#64748b",)
+
+    rows = []
+    keystrokes = []
+    for i in range(1, len(QUERY) + 1):
+        t = time.perf_counter()
+        hits = sort_tweaks(search.query(QUERY[:i], MAX_HITS), "По имени")
+        rows = sync_tree_rows(tree, rows, hits, make_row)
+        if tk_root is not None:
+            tk_root.update_idletasks()
+        keystrokes.append(time.perf_counter() - t)
+    result["keystroke_mean_ms"] = _ms(statistics.mean(keystrokes))
+    result["keystroke_max_ms"] = _ms(max(keystrokes))
+
+    # --- Обновление списка самой большой категории ---
+    rows = sync_tree_rows(tree, rows, [], make_row)
+    big = max(catalog.folders(), key=lambda c: len(catalog.folder(c)))
+    result["refresh_rows"] = len(catalog.folder(big))
+    refreshes = []
+    for sort_type in ("По имени", "По дате", "По размеру", "По имени"):
+        t = time.perf_counter()
+        rows = sync_tree_rows(tree, rows, sort_tweaks(catalog.folder(big), sort_type), make_row)
+        if tk_root is not None:
+            tk_root.update_idletasks()
+        refreshes.append(time.perf_counter() - t)
+    result["refresh_first_ms"] = _ms(refreshes[0])
+    result["refresh_resort_ms"] = _ms(max(refreshes[1:]))
+
+    # --- Предпросмотр ---
+    rng = random.Random(2)
+    sample = rng.sample(list(catalog.all()), min(200, len(catalog)))
+    loader = PreviewLoader()
+    t = time.perf_counter()
+    for tw in sample:
+        loader.get(tw)
+    result["preview_cold_ms"] = _ms((time.perf_counter() - t) / len(sample))
+    t = time.perf_counter()
+    for tw in sample:
+        loader.get(tw)
+    result["preview_warm_ms"] = _ms((time.perf_counter() - t) / len(sample))
+    large = [tw for tw in catalog.folder(big) if tw.name.startswith("large")]
+    t = time.perf_counter()
+    for tw in large:
+        loader.get(tw)
+    result["preview_large_ms"] = _ms((time.perf_counter() - t) / max(1, len(large)))
+
+    # --- Терминал: строк в секунду через буферизированный вывод ---
+    runs_dir = os.path.join(root, "runs")
+    sink = TerminalSink(text, runs_dir)
+    sink.begin_run()
+    n_lines = 200000
+    t = time.perf_counter()
+    for i in range(n_lines):
+        sink.write(f"line {i} {QUERY}")
+        if i % 2000 == 1999:
+            sink.flush()
+            if tk_root is not None:
+                tk_root.update_idletasks()
+    sink.flush()
+    sink.end_run()
+    # без дисплея вывод идёт в заглушку - это скорость буферизации, а не отрисовки Tk, поэтому метрика своя
+    key = "terminal_lines_per_sec" if widgets == "tk" else "terminal_stub_lines_per_sec"
+    result[key] = round(n_lines / (time.perf_counter() - t))
+
+    # --- Выполнение: вывод процесса и пропускная способность пакета ---
+    run_dir = os.path.join(root, "run")
+    verbose = Tweak("verbose.bat", os.path.join(run_dir, "verbose.bat"), "run")
+    events = queue.Queue()
+    t = time.perf_counter()
+    run_tweak(verbose, events.put)
+    result["exec_lines_per_sec"] = round(events.qsize() / (time.perf_counter() - t))
+    quick = [Tweak(f"quick{i}.reg", os.path.join(run_dir, f"quick{i}.reg"), "run") for i in range(100)]
+    for workers in (1, 8):
+        runner = BatchRunner(quick, queue.Queue(), max_workers=workers, tweaks_dir=run_dir)
+        t = time.perf_counter()
+        runner.start()
+        runner.thread.join()
+        result[f"exec_w{workers}_tweaks_per_sec"] = round(len(quick) / (time.perf_counter() - t), 1)
+
+    if tk_root is not None:
+        tk_root.destroy()
+    result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return result
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        return 0.0
+
+
+# То, что окно делает до первой отрисовки, кроме самого Tk: импорт модулей и загрузка индекса каталога
+STARTUP_SNIPPET = """
+import core, catalog, search, engine, preview, watcher, profiler, treesync, terminal
+index = catalog.CatalogIndex(core.TWEAKS_DIR, core.INDEX_FILE, core.SUPPORTED_EXTS)
+index.load()
+catalog.TweakCatalog(index.tweaks())
+"""
+
+
+def _median_run(cmd, cwd, env, repeats):
+    timings = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - t)
+    return _ms(statistics.median(timings))
+
+
+def measure_startup(workdir, size, repeats=5):
+    # Холодный старт в отдельном процессе на готовом индексе: загрузка каталога для окна и "optimizer list"
+    root = os.path.join(workdir, f"tree-{size}")
+    make_tree(root, size)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    cli = [sys.executable, "-m", "optimizer", "list"]
+    subprocess.run(cli, cwd=root, env=env, check=True, stdout=subprocess.DEVNULL)  # создаёт индекс каталога
+    return {"startup_load_ms": _median_run([sys.executable, "-c", STARTUP_SNIPPET], root, env, repeats),
+            "startup_cli_list_ms": _median_run(cli, root, env, repeats)}
+
+
+def compare(results, baseline, tolerance):
+    # Возвращает список регрессий (метрика, было, стало)
+    regressions = []
+    for key, value in sorted(results.items()):
+        base = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(base, (int, float)) or base == 0:
+            continue
+        if key.endswith(HIGHER_IS_BETTER):
+            worse = value < base * (1 - tolerance)
+        else:
+            worse = value > base * (1 + tolerance)
+            if key.endswith("_ms"):
+                worse = worse and value - base > MIN_DELTA_MS
+        if worse:
+            regressions.append((key, base, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки Optimizer")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="размеры деревьев через запятую")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "optimizer-bench"),
+                        help="папка для синтетических деревьев (переиспользуется между запусками)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="файл эталонных результатов")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты в файл эталона")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="допустимое ухудшение, доля")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--case", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    if args.case is not None:
+        print(json.dumps(run_case(args.case, args.workdir)))
+        return 0
+
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"# {size} файлов...", file=sys.stderr, flush=True)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", str(size), "--workdir", args.workdir],
+                             check=True, stdout=subprocess.PIPE, text=True).stdout
+        case = json.loads(out.strip().splitlines()[-1])
+        case.update(measure_startup(args.workdir, size))
+        for key, value in case.items():
+            results[f"{size}.{key}"] = value
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        print(f"ВНИМАНИЕ: нет файла эталона {args.baseline} (создать: --save-baseline)", file=sys.stderr)
+    width = max(len(k) for k in results)
+    for key, value in sorted(results.items()):
+        base = baseline.get(key)
+        print(f"{key:<{width}}  {value!s:>14}  {'' if base is None else base!s:>14}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Эталон сохранён: {args.baseline}")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for key, base, value in regressions:
+        print(f"РЕГРЕССИЯ {key}: было {base}, стало {value}")
+    missing = sorted(k for k, v in results.items() if isinstance(v, (int, float)) and k not in baseline)
+    if missing:
+        print(f"ВНИМАНИЕ: в эталоне нет метрик ({len(missing)}): {', '.join(missing)}", file=sys.stderr)
+    if not baseline or len(missing) == len(results):
+        # сравнивать не с чем - это ошибка, а не успешный прогон
+        return 2
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
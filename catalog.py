@@ -0,0 +1,277 @@
+import os
+import json
+import threading
+from profiler import get_profiler
+
+# --- Индекс каталога твиков ---
+# Хранит на диске список папок (mtime, подпапки, твики). При запуске папка
+# пересканируется только если изменился её mtime, остальные берутся из индекса.
+
+INDEX_VERSION = 2
+
+
+class Tweak:
+    __slots__ = ("name", "path", "ext", "folder", "size", "mtime")
+
+    def __init__(self, name, path, folder, size=0, mtime=0.0):
+        self.name = name
+        self.path = path
+        self.ext = os.path.splitext(name)[1].lower()
+        self.folder = folder
+        self.size = size
+        self.mtime = mtime
+
+    def __repr__(self):
+        return f"Tweak({self.path!r})"
+
+
+class TweakCatalog:
+    # Твики в памяти: по папкам и по пути (iid строки в Treeview), поиск за O(1)
+    def __init__(self, by_folder=None):
+        self.by_folder = {}
+        self.by_path = {}
+        for folder, tws in (by_folder or {}).items():
+            self.set_folder(folder, tws)
+
+    def __contains__(self, folder):
+        return folder in self.by_folder
+
+    def __len__(self):
+        return len(self.by_path)
+
+    def folders(self):
+        return list(self.by_folder)
+
+    def folder(self, folder):
+        return self.by_folder.get(folder, [])
+
+    def get(self, path):
+        return self.by_path.get(path)
+
+    def resolve(self, paths):
+        result = []
+        for path in paths:
+            tw = self.by_path.get(path)
+            if tw is not None:
+                result.append(tw)
+        return result
+
+    def all(self):
+        return self.by_path.values()
+
+    def snapshot(self):
+        return dict(self.by_folder)
+
+    def set_folder(self, folder, tws):
+        self.remove_folder(folder)
+        self.by_folder[folder] = tws
+        for tw in tws:
+            self.by_path[tw.path] = tw
+
+    def remove_folder(self, folder):
+        for tw in self.by_folder.pop(folder, []):
+            if self.by_path.get(tw.path) is tw:
+                del self.by_path[tw.path]
+
+
+class CatalogIndex:
+    def __init__(self, tweaks_dir, index_file, exts):
+        self.tweaks_dir = tweaks_dir
+        self.index_file = index_file
+        self.exts = tuple(exts)
+        self.dirs = {}  # rel_root -> {"mtime_ns", "subdirs", "tweaks"}
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.tweaks_dir:
+            return False
+        dirs = {}
+        try:
+            for rel, entry in data.get("dirs", {}).items():
+                abs_dir = self._abs_dir(rel)
+                tws = [Tweak(name, os.path.join(abs_dir, name), rel, size, mtime) for name, size, mtime in entry["tweaks"]]
+                dirs[rel] = {"mtime_ns": entry["mtime_ns"], "subdirs": entry["subdirs"], "tweaks": tws}
+        except (KeyError, TypeError, ValueError):
+            return False
+        with self._lock:
+            self.dirs = dirs
+        return True
+
+    def _abs_dir(self, rel):
+        return self.tweaks_dir if rel == "." else os.path.join(self.tweaks_dir, rel)
+
+    def save(self):
+        with self._lock:
+            # твик хранится компактно: [имя, размер, mtime], путь восстанавливается из папки
+            dirs = {
+                rel: {"mtime_ns": e["mtime_ns"], "subdirs": e["subdirs"], "tweaks": [[tw.name, tw.size, tw.mtime] for tw in e["tweaks"]]}
+                for rel, e in self.dirs.items()
+            }
+            data = {"version": INDEX_VERSION, "root": self.tweaks_dir, "dirs": dirs}
+            tmp = self.index_file + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, self.index_file)
+            except Exception:
+                pass
+
+    def tweaks(self):
+        with self._lock:
+            return {rel: entry["tweaks"] for rel, entry in self.dirs.items() if entry["tweaks"]}
+
+    def _scan_dir(self, abs_dir, rel, mtime_ns):
+        subdirs = []
+        tws = []
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        # как os.walk: ссылки на папки не обходим
+                        if not entry.is_symlink():
+                            subdirs.append(entry.name)
+                        continue
+                    if not entry.name.lower().endswith(self.exts):
+                        continue
+                    st = entry.stat()
+                    tws.append(Tweak(entry.name, os.path.join(abs_dir, entry.name), rel, st.st_size, st.st_mtime))
+                except OSError:
+                    continue
+        return {"mtime_ns": mtime_ns, "subdirs": subdirs, "tweaks": tws}
+
+    def update(self, on_folder=None, stop_event=None):
+        # Обход в том же порядке, что и os.walk (сверху вниз).
+        # on_folder(rel_root, tweaks) вызывается для каждой папки с твиками сразу после индексации.
+        with self._lock:
+            old_dirs = self.dirs
+        new_dirs = {}
+        changed = 0
+        stack = [(self.tweaks_dir, ".")]
+        while stack:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            abs_dir, rel = stack.pop()
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+                entry = old_dirs.get(rel)
+                if entry is None or entry["mtime_ns"] != mtime_ns:
+                    entry = self._scan_dir(abs_dir, rel, mtime_ns)
+                    changed += 1
+            except OSError:
+                continue
+            new_dirs[rel] = entry
+            if on_folder is not None and entry["tweaks"]:
+                on_folder(rel, entry["tweaks"])
+            for name in reversed(entry["subdirs"]):
+                stack.append((os.path.join(abs_dir, name), os.path.normpath(os.path.join(rel, name))))
+        removed = [rel for rel in old_dirs if rel not in new_dirs]
+        with self._lock:
+            self.dirs = new_dirs
+        if changed or removed:
+            self.save()
+        return self.tweaks()
+
+    def _subtree(self, dirs, rel):
+        if rel == ".":
+            return list(dirs)
+        prefix = rel + os.sep
+        return [r for r in dirs if r == rel or r.startswith(prefix)]
+
+    def refresh(self, rels):
+        # Пересканирование только указанных папок (события наблюдателя за файлами).
+        # Новые подпапки индексируются целиком, исчезнувшие удаляются вместе с вложенными.
+        # Возвращает {rel: tweaks} только для папок, где список твиков изменился ([] - твиков не осталось).
+        with self._lock:
+            dirs = dict(self.dirs)
+        stack = []
+        for rel in set(rels):
+            # папка, которой нет в индексе, найдётся при пересканировании ближайшего известного родителя
+            while rel not in dirs and rel != ".":
+                rel = os.path.dirname(rel) or "."
+            stack.append(rel)
+        stack.sort(reverse=True)
+        changes = {}
+
+        def drop(rel):
+            for sub in self._subtree(dirs, rel):
+                if dirs.pop(sub)["tweaks"]:
+                    changes[sub] = []
+
+        seen = set()
+        while stack:
+            rel = stack.pop()
+            if rel in seen:
+                continue
+            seen.add(rel)
+            abs_dir = self._abs_dir(rel)
+            old = dirs.get(rel)
+            try:
+                entry = self._scan_dir(abs_dir, rel, os.stat(abs_dir).st_mtime_ns)
+            except OSError:
+                drop(rel)
+                continue
+            old_tweaks = old["tweaks"] if old else []
+            if [(tw.name, tw.size, tw.mtime) for tw in entry["tweaks"]] == [(tw.name, tw.size, tw.mtime) for tw in old_tweaks]:
+                # твики не изменились - оставляем прежние объекты, на них ссылаются каталог и GUI
+                entry["tweaks"] = old_tweaks
+            elif entry["tweaks"] or old_tweaks:
+                changes[rel] = entry["tweaks"]
+            dirs[rel] = entry
+            for name in set(old["subdirs"] if old else ()) - set(entry["subdirs"]):
+                drop(os.path.normpath(os.path.join(rel, name)))
+            for name in entry["subdirs"]:
+                sub = os.path.normpath(os.path.join(rel, name))
+                if sub not in dirs:
+                    stack.append(sub)
+        with self._lock:
+            self.dirs = dirs
+        if changes:
+            self.save()
+        return changes
+
+    def changed_dirs(self, stop_event=None, files=True):
+        # Для опроса без inotify: папки, у которых изменился mtime или размер/mtime одного из твиков.
+        # files=False - только mtime папок (создание, удаление, переименование): один stat на папку
+        with self._lock:
+            dirs = list(self.dirs.items())
+        result = []
+        for rel, entry in dirs:
+            if stop_event is not None and stop_event.is_set():
+                break
+            try:
+                if os.stat(self._abs_dir(rel)).st_mtime_ns != entry["mtime_ns"]:
+                    result.append(rel)
+                    continue
+                if not files:
+                    continue
+                for tw in entry["tweaks"]:
+                    st = os.stat(tw.path)
+                    if st.st_size != tw.size or st.st_mtime != tw.mtime:
+                        result.append(rel)
+                        break
+            except OSError:
+                result.append(rel)
+        return result
+
+
+def start_background_scan(index, on_folder, on_done):
+    # Сканирование в отдельном потоке; колбэки вызываются из этого потока,
+    # поэтому GUI должен передавать данные в главный поток через очередь.
+    stop_event = threading.Event()
+
+    def worker():
+        try:
+            with get_profiler().span("catalog.scan", "catalog"):
+                result = index.update(on_folder=on_folder, stop_event=stop_event)
+        except Exception:
+            result = None
+        on_done(result)
+
+    thread = threading.Thread(target=worker, name="catalog-scan", daemon=True)
+    thread.start()
+    return thread, stop_event
@@ -0,0 +1,389 @@
+import os
+import re
+import time
+import uuid
+import queue
+import tempfile
+import threading
+import subprocess
+from engine import kill_process, RunResult, run_tweak
+from preview import detect_encoding
+from outstream import OutputSpool, LineSplitter, CHUNK_SIZE
+from profiler import get_profiler
+
+# --- Объединение запусков ---
+# Совместимые твики выполняются в одном процессе интерпретатора вместо отдельного запуска на каждый:
+#   .bat/.cmd - цепочка call в одном сценарии cmd (setlocal/endlocal между твиками)
+#   .ps1      - один процесс PowerShell выполняет все сценарии группы по очереди
+#   .reg      - файлы сливаются в один и импортируются одним reg import
+# Перед и после каждого твика сценарий печатает маркеры ##OPT:B:<токен>:<номер>## и
+# ##OPT:E:<токен>:<номер>:<код>##, по ним вывод и код завершения разносятся по твикам.
+# На Linux вместо cmd/PowerShell/reg используются заменители на sh (для проверки движка).
+
+MAX_SESSION_TWEAKS = 64
+REG_HEADER = "Windows Registry Editor Version 5.00"
+
+if os.name == "nt":
+    SHELL_CMD = ["cmd", "/d", "/q", "/c"]
+    POWERSHELL_CMD = ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-File"]
+    REG_IMPORT_CMD = ["reg", "import"]
+else:
+    SHELL_CMD = ["sh"]
+    POWERSHELL_CMD = ["sh"]
+    REG_IMPORT_CMD = ["sh", "-c", 'test -r "$1"', "reg-import"]
+
+SESSION_KINDS = {".bat": "shell", ".cmd": "shell", ".ps1": "powershell", ".reg": "reg"}
+MARKER_RE = re.compile(rb"##OPT:([BE]):([0-9a-f]+):(\d+)(?::(-?\d+))?##[ \t]*\r?\n?")
+
+
+def session_kind(tw):
+    return SESSION_KINDS.get(tw.ext)
+
+
+def _oem_encoding():
+    import ctypes
+    return f"cp{ctypes.windll.kernel32.GetOEMCP()}"
+
+
+def _sh_quote(text):
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def build_shell_script(tweaks, token):
+    # (расширение, текст сценария, кодировка)
+    if os.name != "nt":
+        return ".sh", _build_sh_script(tweaks, token), "utf-8"
+    lines = ["@echo off"]
+    for i, tw in enumerate(tweaks):
+        path = tw.path.replace("%", "%%")
+        lines += [
+            f"@echo ##OPT:B:{token}:{i}##",
+            f"@echo ##OPT:B:{token}:{i}## 1>&2",
+            "@setlocal",
+            f'@call "{path}"',
+            f"@echo ##OPT:E:{token}:{i}:%errorlevel%##",
+            "@endlocal",
+            "@echo off",
+        ]
+    # cmd читает сценарий в OEM-кодировке консоли
+    return ".cmd", "\r\n".join(lines) + "\r\n", _oem_encoding()
+
+
+def build_powershell_script(tweaks, token):
+    if os.name != "nt":
+        return ".sh", _build_sh_script(tweaks, token), "utf-8"
+    lines = ["$ErrorActionPreference = 'Continue'"]
+    for i, tw in enumerate(tweaks):
+        path = tw.path.replace("'", "''")
+        lines += [
+            f"Write-Output '##OPT:B:{token}:{i}##'; [Console]::Error.WriteLine('##OPT:B:{token}:{i}##')",
+            "$global:LASTEXITCODE = 0",
+            "Push-Location",
+            f"try {{ & '{path}'; $rc = if ($?) {{ [int]$global:LASTEXITCODE }} else {{ 1 }} }}"
+            " catch { [Console]::Error.WriteLine($_); $rc = 1 } finally { Pop-Location }",
+            f'Write-Output "##OPT:E:{token}:{i}:$rc##"',
+        ]
+    return ".ps1", "\r\n".join(lines) + "\r\n", "utf-8-sig"
+
+
+def _build_sh_script(tweaks, token):
+    # Заменитель cmd/PowerShell: каждый твик в подоболочке, как отдельный процесс в spawn_tweak
+    lines = []
+    for i, tw in enumerate(tweaks):
+        lines += [
+            f"echo '##OPT:B:{token}:{i}##'; echo '##OPT:B:{token}:{i}##' >&2",
+            f"( {_sh_quote(tw.path)} )",
+            f'echo "##OPT:E:{token}:{i}:$?##"',
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def read_reg_body(path):
+    # Тело .reg без заголовка; None - файл не в формате версии 5 (REGEDIT4 сливать нельзя:
+    # у него другие правила для hex(2)/hex(7))
+    with open(path, "rb") as f:
+        raw = f.read()
+    text = raw.decode(detect_encoding(raw[:64 * 1024]), errors="replace").lstrip("\ufeff")
+    head, _, body = text.partition("\n")
+    if head.strip() != REG_HEADER:
+        return None
+    return body.replace("\r\n", "\n").strip("\n")
+
+
+def _write_temp(suffix, text, encoding):
+    data = text.encode(encoding)
+    fd, path = tempfile.mkstemp(prefix="optimizer-session-", suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _spawn(argv):
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    return subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+
+
+def _pump_session(stream, name, token, jobs, results, begins, markers, emit, on_result, spool_dir):
+    # Маркеры ищутся прямо в байтах, всё между ними уходит в OutputSpool текущего твика
+    # (так маркер не теряется, даже если вывод твика сбрасывается на диск или двоичный).
+    # Вывод до первого маркера (баннер интерпретатора) отбрасывается. Начало и конец твика
+    # сообщает поток stdout, чтобы "start" следующего не опережал "exit" предыдущего.
+    counter = name + "_bytes"
+    token = token.encode()
+    current = None
+    out = None
+
+    def feed(segment):
+        if current is None or not segment:
+            return
+        setattr(results[current], counter, getattr(results[current], counter) + len(segment))
+        for line in out.feed(segment):
+            emit(("line", jobs[current].tweak, (name, line)))
+
+    def finish():
+        if out is not None:
+            for line in out.finish():
+                emit(("line", jobs[current].tweak, (name, line)))
+
+    def process(data):
+        nonlocal current, out
+        pos = 0
+        if b"##OPT:" in data:
+            for m in MARKER_RE.finditer(data):
+                if m.group(2) != token:
+                    continue
+                feed(data[pos:m.start()])
+                pos = m.end()
+                finish()
+                i = int(m.group(3))
+                if m.group(1) == b"B":
+                    current = i
+                    out = OutputSpool(jobs[i].tweak.name, name, spool_dir)
+                    if name == "stdout":
+                        begins[i] = time.monotonic()
+                        results[i].started = time.time()
+                        emit(("start", jobs[i].tweak, i))
+                        markers.put(("B", i, None))
+                else:
+                    current = out = None
+                    if name == "stdout":
+                        result = results[i]
+                        result.code = int(m.group(4))
+                        result.duration = time.monotonic() - begins[i]
+                        on_result(jobs[i], result)
+                        markers.put(("E", i, None))
+        feed(data[pos:] if pos else data)
+
+    carry = b""
+    try:
+        while True:
+            data = stream.read1(CHUNK_SIZE)
+            if not data:
+                break
+            if carry:
+                data, carry = carry + data, b""
+            # хвост без перевода строки, в котором может начинаться маркер, ждёт следующего блока
+            tail = data.rfind(b"\n") + 1
+            if len(data) - tail < CHUNK_SIZE and b"#" in data[tail:]:
+                data, carry = data[:tail], data[tail:]
+            process(data)
+        process(carry)
+    except (OSError, ValueError):
+        pass
+    finally:
+        finish()
+        if name == "stdout":
+            markers.put(("eof", None, None))
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+
+def run_session(jobs, emit, cancel_event=None, on_result=None, spool_dir=None):
+    # Выполняет группу твиков одного вида в одном процессе.
+    # on_result(job, result) вызывается по мере завершения твиков; возвращает задачи,
+    # до которых очередь не дошла (процесс упал, таймаут, отмена) - их нужно запустить заново.
+    kind = session_kind(jobs[0].tweak)
+    if kind == "reg":
+        return _run_reg_session(jobs, emit, cancel_event, on_result, spool_dir)
+    token = uuid.uuid4().hex[:12]
+    tweaks = [job.tweak for job in jobs]
+    build = build_shell_script if kind == "shell" else build_powershell_script
+    try:
+        suffix, text, encoding = build(tweaks, token)
+        script = _write_temp(suffix, text, encoding)
+    except UnicodeEncodeError:
+        # путь не представим в кодировке консоли - выполняем по одному
+        return _run_each(jobs, emit, cancel_event, on_result, spool_dir)
+    try:
+        left = _run_script(jobs, (SHELL_CMD if kind == "shell" else POWERSHELL_CMD) + [script],
+                           token, emit, cancel_event, on_result, spool_dir)
+    finally:
+        try:
+            os.remove(script)
+        except OSError:
+            pass
+    if len(left) == len(jobs):
+        # интерпретатор не дошёл даже до первого твика - без повторной группировки запускаем по одному
+        return _run_each(jobs, emit, cancel_event, on_result, spool_dir)
+    return left
+
+
+def _run_script(jobs, argv, token, emit, cancel_event, on_result, spool_dir):
+    results = [RunResult() for _ in jobs]
+    begins = [None] * len(jobs)
+    markers = queue.Queue()
+    profiler = get_profiler()
+    spawn_start = time.perf_counter()
+    proc = _spawn(argv)
+    profiler.record("spawn", spawn_start, time.perf_counter(), "process", {"session": argv[0], "pid": proc.pid})
+    readers = [
+        threading.Thread(target=_pump_session, args=(proc.stdout, "stdout", token, jobs, results, begins, markers, emit, on_result, spool_dir), daemon=True),
+        threading.Thread(target=_pump_session, args=(proc.stderr, "stderr", token, jobs, results, begins, markers, emit, on_result, spool_dir), daemon=True),
+    ]
+    for r in readers:
+        r.start()
+    current = None
+    deadline = None
+    killed_at = None
+    finished = 0
+    while True:
+        try:
+            kind, i, _ = markers.get(timeout=0.1)
+        except queue.Empty:
+            if killed_at is not None:
+                # после убийства дочерние процессы могут держать трубу открытой
+                if time.monotonic() - killed_at > 2:
+                    break
+                continue
+            if cancel_event is not None and cancel_event.is_set():
+                killed_at = time.monotonic()
+                kill_process(proc)
+            elif deadline is not None and time.monotonic() > deadline:
+                killed_at = time.monotonic()
+                results[current].timed_out = True
+                emit(("timeout", jobs[current].tweak, jobs[current].timeout))
+                kill_process(proc)
+            continue
+        if kind == "eof":
+            break
+        if kind == "B":
+            current = i
+            timeout = jobs[i].timeout
+            deadline = begins[i] + timeout if timeout else None
+        else:
+            current = deadline = None
+            finished = i + 1
+    code = proc.wait()
+    profiler.record("session", spawn_start, time.perf_counter(), "process",
+                    {"session": argv[0], "pid": proc.pid, "tweaks": len(jobs), "code": code})
+    for r in readers:
+        r.join(timeout=2 if killed_at is not None else None)
+    if current is not None:
+        # твик не дошёл до маркера конца: упал интерпретатор, таймаут или отмена
+        result = results[current]
+        result.code = code
+        result.duration = time.monotonic() - begins[current]
+        on_result(jobs[current], result)
+        finished = current + 1
+    return jobs[finished:]
+
+
+def _run_each(jobs, emit, cancel_event, on_result, spool_dir=None, announced=False):
+    # announced - "start" для этих твиков уже отправлен (откат после неудачного общего импорта .reg)
+    for n, job in enumerate(jobs):
+        if cancel_event is not None and cancel_event.is_set():
+            return jobs[n:]
+        if not announced:
+            emit(("start", job.tweak, n))
+        on_result(job, run_tweak(job.tweak, emit, cancel_event, job.timeout, spool_dir))
+    return []
+
+
+def _run_reg_session(jobs, emit, cancel_event, on_result, spool_dir):
+    # Подряд идущие файлы версии 5 сливаются в один, остальные импортируются по одному (порядок сохраняется)
+    segments = []  # [(сливаемые?, [(задача, тело)])]
+    for job in jobs:
+        try:
+            body = read_reg_body(job.tweak.path)
+        except OSError:
+            body = None
+        if segments and segments[-1][0] == (body is not None):
+            segments[-1][1].append((job, body))
+        else:
+            segments.append((body is not None, [(job, body)]))
+    done = 0
+    for mergeable, items in segments:
+        if cancel_event is not None and cancel_event.is_set():
+            return jobs[done:]
+        if mergeable and len(items) > 1:
+            left = _import_merged(items, emit, cancel_event, on_result, spool_dir)
+        else:
+            left = _run_each([job for job, _ in items], emit, cancel_event, on_result, spool_dir)
+        if left:
+            return left + jobs[done + len(items):]
+        done += len(items)
+    return []
+
+
+def _split_output(data):
+    splitter = LineSplitter()
+    return splitter.feed(data) + splitter.finish()
+
+
+def _import_merged(items, emit, cancel_event, on_result, spool_dir):
+    # Если общий импорт не удался, импортируем по одному, чтобы код завершения у каждого твика был точным
+    jobs = [job for job, _ in items]
+    text = "\ufeff" + REG_HEADER + "\r\n\r\n" + "\r\n\r\n".join(body for _, body in items).replace("\n", "\r\n") + "\r\n"
+    merged = _write_temp(".reg", text, "utf-16-le")
+    timeouts = [job.timeout for job in jobs]
+    deadline = time.monotonic() + sum(timeouts) if all(timeouts) else None
+    timed_out = False
+    try:
+        for n, job in enumerate(jobs):
+            emit(("start", job.tweak, n))
+        started = time.time()
+        begin = time.monotonic()
+        spawn_start = time.perf_counter()
+        proc = _spawn(REG_IMPORT_CMD + [merged])
+        get_profiler().record("spawn", spawn_start, time.perf_counter(), "process", {"session": "reg", "pid": proc.pid})
+        while True:
+            try:
+                out, err = proc.communicate(timeout=0.1)
+                break
+            except subprocess.TimeoutExpired:
+                if deadline is not None and not timed_out and time.monotonic() > deadline:
+                    timed_out = True
+                    emit(("timeout", jobs[0].tweak, sum(timeouts)))
+                    kill_process(proc)
+                elif cancel_event is not None and cancel_event.is_set():
+                    kill_process(proc)
+        duration = time.monotonic() - begin
+        get_profiler().record("session", spawn_start, time.perf_counter(), "process",
+                              {"session": "reg", "pid": proc.pid, "tweaks": len(jobs), "code": proc.returncode})
+    finally:
+        try:
+            os.remove(merged)
+        except OSError:
+            pass
+    first = jobs[0].tweak
+    cancelled = timed_out or (cancel_event is not None and cancel_event.is_set())
+    if proc.returncode != 0 and not cancelled:
+        for line in _split_output(err):
+            emit(("line", first, ("stderr", line)))
+        emit(("line", first, ("stderr", "Общий импорт .reg не удался, импортируем по одному")))
+        return _run_each(jobs, emit, cancel_event, on_result, spool_dir, announced=True)
+    for line in _split_output(out):
+        emit(("line", first, ("stdout", line)))
+    for job in jobs:
+        result = RunResult(code=proc.returncode, started=started, duration=duration / len(jobs), timed_out=timed_out)
+        if job.tweak is first:
+            result.stdout_bytes = len(out)
+            result.stderr_bytes = len(err)
+        on_result(job, result)
+    return []
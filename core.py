@@ -0,0 +1,147 @@
+import os
+import json
+import datetime
+from catalog import CatalogIndex, TweakCatalog
+from preview import read_preview
+from runlog import get_logger
+from profiler import profiled
+
+# --- Ядро без GUI: каталог, запуск, журнал ---
+# Используется и окном (gui.py), и командной строкой (optimizer.py).
+
+TWEAKS_DIR = "tweaks"
+SETTINGS_FILE = "optimizer_settings.json"
+LOG_FILE = "optimizer_log.jsonl"
+INDEX_FILE = "optimizer_index.json"
+SEARCH_INDEX_FILE = "optimizer_search.bin"
+RUNS_DIR = "optimizer_runs"
+HISTORY_FILE = "optimizer_history.sqlite3"
+MANIFEST_FILE = "optimizer_applied.json"
+
+DEFAULT_WORKERS = 1  # параллельный запуск - только по выбору пользователя, как и --parallel в CLI
+SUPPORTED_EXTS = (".bat", ".cmd", ".exe", ".vbs", ".ps1", ".reg", ".pow")
+
+# --- Вспомогательные функции ---
+def sort_tweaks(tweaks, sort_type, stats=None):
+    # Размер и дата берутся из записей каталога, без обращений к диску
+    if sort_type == "По времени выполнения":
+        # медиана времени по истории, сначала самые долгие; без истории - в конце
+        stats = stats or {}
+        return sorted(tweaks, key=lambda x: stats[x.path].p50 if x.path in stats else -1.0, reverse=True)
+    if sort_type == "По дате":
+        return sorted(tweaks, key=lambda x: x.mtime, reverse=True)
+    if sort_type == "По размеру":
+        return sorted(tweaks, key=lambda x: x.size, reverse=True)
+    return sorted(tweaks, key=lambda x: x.name.lower())
+
+def get_tweak_content(filepath, max_lines=500):
+    try:
+        return read_preview(filepath, max_lines)
+    except Exception as e:
+        return f"Ошибка чтения: {e}"
+
+@profiled("find_tweaks")
+def find_tweaks():
+    index = CatalogIndex(TWEAKS_DIR, INDEX_FILE, SUPPORTED_EXTS)
+    index.load()
+    return index.update()
+
+def save_settings(settings):
+    try:
+        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+    except Exception:
+        pass
+
+def load_settings():
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def get_run_logger():
+    return get_logger(LOG_FILE)
+
+_history = None
+
+def get_history():
+    global _history
+    if _history is None:
+        from history import HistoryStore
+        _history = HistoryStore(HISTORY_FILE)
+    return _history
+
+_manifest = None
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        from manifest import ApplyManifest
+        _manifest = ApplyManifest(MANIFEST_FILE)
+    return _manifest
+
+def log_action(action):
+    get_run_logger().log_action(action)
+
+def get_tweak_info(tw):
+    try:
+        stat = os.stat(tw.path)
+        size = stat.st_size
+        mtime = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        return f"Имя: {tw.name}\nПуть: {tw.path}\nПапка: {tw.folder}\nРазмер: {size} байт\nДата изменения: {mtime}\nРасширение: {tw.ext}"
+    except Exception as e:
+        return f"Ошибка получения информации: {e}"
+
+def load_catalog():
+    return TweakCatalog(find_tweaks())
+
+def select_tweaks(catalog, categories=(), names=()):
+    # Категории - папки целиком, по имени файла; names - имена файлов или пути твиков.
+    # Порядок - как задал пользователь (или пресет), повторы отбрасываются
+    result = []
+    seen = set()
+
+    def add(tws):
+        for tw in tws:
+            if tw.path not in seen:
+                seen.add(tw.path)
+                result.append(tw)
+
+    for cat in categories:
+        add(sort_tweaks(catalog.folder(os.path.normpath(cat)), "По имени"))
+    if names:
+        # пути сравниваем нормализованными: пресет флота может прийти с "/" на агент под Windows
+        index = {}
+        for tw in sorted(catalog.all(), key=lambda x: x.path):
+            index.setdefault(tw.name.lower(), []).append(tw)
+            index.setdefault(os.path.normpath(tw.path).lower(), []).append(tw)
+        for name in names:
+            add(index.get(os.path.normpath(name).lower(), ()))
+    return result
+
+def run_batch(tweaks, on_event, max_workers=1, default_timeout=None, force=False, coalesce=False, cancel_event=None):
+    # Блокирующий запуск пакета: события движка передаются в on_event(kind, tw, data);
+    # cancel_event - остановка из другого потока (агент флота)
+    import queue
+    from engine import BatchRunner
+    events = queue.Queue()
+    runner = BatchRunner(tweaks, events, max_workers=max_workers, tweaks_dir=TWEAKS_DIR, default_timeout=default_timeout,
+                         recorders=[get_run_logger(), get_history()], manifest=get_manifest(), force=force, coalesce=coalesce,
+                         spool_dir=RUNS_DIR)
+    runner.start()
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set() and not runner.cancel_event.is_set():
+                runner.cancel()
+            try:
+                kind, tw, data = events.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            on_event(kind, tw, data)
+            if kind == "batch_done":
+                return data
+    except KeyboardInterrupt:
+        runner.cancel()
+        runner.thread.join()
+        raise
@@ -0,0 +1,306 @@
+import os
+import time
+import queue
+import signal
+import subprocess
+import threading
+from collections import Counter
+from scheduler import plan_batch, next_ready
+from outstream import OutputSpool, CHUNK_SIZE
+from profiler import get_profiler
+
+# --- Движок запуска твиков ---
+# Каждый процесс читается двумя отдельными потоками (stdout и stderr) блоками по CHUNK_SIZE,
+# разбор на строки и сброс большого вывода на диск - в outstream.py.
+# События отправляются в потокобезопасную очередь: (вид, твик, данные).
+# GUI забирает их из очереди через after() и не блокируется.
+
+
+def spawn_tweak(tw):
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    return subprocess.Popen(tw.path, shell=True, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+
+
+def kill_process(proc):
+    # shell=True: убиваем всё дерево, а не только оболочку
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except Exception:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+
+class RunResult:
+    __slots__ = ("code", "started", "duration", "stdout_bytes", "stderr_bytes", "timed_out", "error")
+
+    def __init__(self, code=None, started=0.0, duration=0.0, timed_out=False, error=None):
+        self.code = code
+        self.started = started
+        self.duration = duration
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        self.timed_out = timed_out
+        self.error = error
+
+
+def _pump(stream, tw, name, emit, result, spool_dir=None):
+    counter = name + "_bytes"
+    out = OutputSpool(tw.name, name, spool_dir)
+    try:
+        while True:
+            data = stream.read1(CHUNK_SIZE)
+            if not data:
+                break
+            setattr(result, counter, getattr(result, counter) + len(data))
+            for line in out.feed(data):
+                emit(("line", tw, (name, line)))
+    except (OSError, ValueError):
+        pass
+    finally:
+        for line in out.finish():
+            emit(("line", tw, (name, line)))
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+
+def run_tweak(tw, emit, cancel_event=None, timeout=None, spool_dir=None):
+    result = RunResult(started=time.time())
+    begin = time.monotonic()
+    # всё, что может упасть, - до запуска процесса, чтобы не оставить его без читателей труб
+    deadline = begin + timeout if timeout else None
+    profiler = get_profiler()
+    spawn_start = time.perf_counter()
+    proc = spawn_tweak(tw)
+    profiler.record("spawn", spawn_start, time.perf_counter(), "process", {"tweak": tw.path, "pid": proc.pid})
+    readers = [
+        threading.Thread(target=_pump, args=(proc.stdout, tw, "stdout", emit, result, spool_dir), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, tw, "stderr", emit, result, spool_dir), daemon=True),
+    ]
+    for r in readers:
+        r.start()
+    cancelled = False
+    while True:
+        try:
+            code = proc.wait(timeout=0.1)
+            break
+        except subprocess.TimeoutExpired:
+            if cancelled:
+                continue
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                kill_process(proc)
+            elif deadline is not None and time.monotonic() > deadline:
+                cancelled = True
+                result.timed_out = True
+                emit(("timeout", tw, timeout))
+                kill_process(proc)
+    exited = time.perf_counter()
+    for r in readers:
+        # после отмены дочерние процессы могут держать трубу открытой
+        r.join(timeout=2 if cancelled else None)
+    profiler.record("process", spawn_start, exited, "process", {"tweak": tw.path, "pid": proc.pid, "code": code})
+    profiler.record("drain", exited, time.perf_counter(), "process", {"tweak": tw.path})
+    result.code = code
+    result.duration = time.monotonic() - begin
+    return result
+
+
+class BatchRunner:
+    # События: ("batch_start", None, total), ("start", tw, index), ("line", tw, (stream, text)),
+    # ("timeout", tw, seconds), ("exit", tw, code), ("error", tw, message), ("skipped", tw, reason),
+    # ("progress", None, (done, total)), ("batch_done", None, cancelled)
+    # recorders - объекты с методом record(tw, result), вызываются из рабочих потоков
+    # manifest - ApplyManifest: идемпотентные твики, уже применённые в этой версии, пропускаются (если не force)
+    # coalesce - совместимые твики (.bat/.cmd, .ps1, .reg) выполняются группами в одном процессе (coalesce.py)
+    # spool_dir - куда сохранять вывод сверх бюджета памяти (по умолчанию временная папка)
+    def __init__(self, tweaks, events, max_workers=1, tweaks_dir=".", default_timeout=None, recorders=(),
+                 manifest=None, force=False, coalesce=False, spool_dir=None):
+        self.tweaks = list(tweaks)
+        self.events = events
+        self.max_workers = max(1, int(max_workers))
+        self.tweaks_dir = tweaks_dir
+        self.default_timeout = default_timeout
+        self.recorders = list(recorders)
+        self.manifest = manifest
+        self.force = force
+        self.coalesce = coalesce
+        self.spool_dir = spool_dir
+        if manifest is not None:
+            self.recorders.append(manifest)
+        self.cancel_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="tweak-runner", daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _record(self, tw, result):
+        for recorder in self.recorders:
+            try:
+                recorder.record(tw, result)
+            except Exception:
+                pass
+
+    def _run_job(self, job, index, finished):
+        # finished получает (задача, выполнена?, рабочий поток освободился?)
+        tw = job.tweak
+        self.events.put(("start", tw, index))
+        try:
+            result = run_tweak(tw, self.events.put, self.cancel_event, job.timeout, self.spool_dir)
+            self.events.put(("exit", tw, result.code))
+        except Exception as e:
+            result = RunResult(started=time.time(), error=str(e))
+            self.events.put(("error", tw, str(e)))
+        self._record(tw, result)
+        finished.put((job, True, True))
+
+    def _run_session(self, jobs, finished):
+        from coalesce import run_session
+        reported = set()
+
+        def on_result(job, result):
+            self.events.put(("exit", job.tweak, result.code))
+            self._record(job.tweak, result)
+            reported.add(job)
+            finished.put((job, True, False))
+
+        try:
+            left = run_session(jobs, self.events.put, self.cancel_event, on_result, self.spool_dir)
+        except Exception as e:
+            left = []
+            for job in jobs:
+                if job not in reported:
+                    self.events.put(("error", job.tweak, str(e)))
+                    self._record(job.tweak, RunResult(started=time.time(), error=str(e)))
+                    finished.put((job, True, False))
+        for job in left:
+            # до этих задач процесс не дошёл - вернутся в очередь
+            finished.put((job, False, False))
+        finished.put((None, False, True))
+
+    def _session_group(self, first, pending, done_paths, busy_groups):
+        # Набираем к first идущие сразу за ним задачи того же вида - только подряд, чтобы объединение
+        # не меняло порядок пакета; на первой неподходящей задаче группа заканчивается. Зависимости
+        # внутри группы допустимы, если цель стоит в группе раньше. При нескольких потоках работа делится.
+        from coalesce import session_kind, MAX_SESSION_TWEAKS
+        kind = session_kind(first.tweak)
+        if kind is None:
+            return [first]
+        run = []
+        for job in pending[pending.index(first) + 1:]:
+            if session_kind(job.tweak) != kind:
+                break
+            run.append(job)
+        limit = min(MAX_SESSION_TWEAKS, -(-(len(run) + 1) // self.max_workers))
+        group = [first]
+        paths = {first.tweak.path}
+        groups = {first.group}
+        for job in run:
+            if len(group) >= limit:
+                break
+            if job.group is not None and job.group in busy_groups and job.group not in groups:
+                break
+            if not job.deps <= done_paths | paths:
+                break
+            group.append(job)
+            paths.add(job.tweak.path)
+            groups.add(job.group)
+        return group
+
+    def _run(self):
+        # batch_done отправляется в любом случае: иначе CLI ждёт вечно, а кнопка запуска в окне не включается
+        try:
+            self._run_batch()
+        finally:
+            if self.manifest is not None:
+                self.manifest.save()
+            self.events.put(("batch_done", None, self.cancel_event.is_set()))
+
+    def _run_batch(self):
+        emit = self.events.put
+        jobs = plan_batch(self.tweaks, self.tweaks_dir, self.default_timeout)
+        skipped = self._already_applied(jobs)
+        total = len(jobs)
+        emit(("batch_start", None, total))
+        pending = [job for job in jobs if job not in skipped]
+        order = {job: i for i, job in enumerate(jobs)}
+        workers = 0
+        busy_groups = Counter()
+        done_paths = set()
+        finished = queue.Queue()
+        started = 0
+        done = 0
+        for job in jobs:
+            if job in skipped:
+                emit(("skipped", job.tweak, "уже применён"))
+                done_paths.add(job.tweak.path)
+                done += 1
+                emit(("progress", None, (done, total)))
+        while pending or workers:
+            while pending and workers < self.max_workers and not self.cancel_event.is_set():
+                job = next_ready(pending, done_paths, busy_groups)
+                if job is None:
+                    if not workers:
+                        # цикл в "after": снимаем зависимости у первой задачи
+                        pending[0].deps.clear()
+                        continue
+                    break
+                group = self._session_group(job, pending, done_paths, busy_groups) if self.coalesce else [job]
+                for member in group:
+                    pending.remove(member)
+                    if member.group is not None:
+                        busy_groups[member.group] += 1
+                workers += 1
+                if len(group) > 1:
+                    threading.Thread(target=self._run_session, args=(group, finished),
+                                     name="tweak-session", daemon=True).start()
+                else:
+                    threading.Thread(target=self._run_job, args=(job, started, finished),
+                                     name="tweak-worker", daemon=True).start()
+                started += len(group)
+            if not workers:
+                break
+            job, ran, released = finished.get()
+            if released:
+                workers -= 1
+            if job is None:
+                continue
+            if job.group is not None:
+                busy_groups[job.group] -= 1
+                if busy_groups[job.group] <= 0:
+                    del busy_groups[job.group]
+            if not ran:
+                pending.append(job)
+                pending.sort(key=order.__getitem__)
+                continue
+            done_paths.add(job.tweak.path)
+            done += 1
+            emit(("progress", None, (done, total)))
+
+    def _already_applied(self, jobs):
+        if self.manifest is None or self.force:
+            return set()
+        candidates = [job for job in jobs if job.idempotent]
+        hashes = self.manifest.hash_many(job.tweak for job in candidates)
+        return {job for job in candidates if self.manifest.is_applied(job.tweak, hashes.get(job.tweak.path))}
@@ -0,0 +1,529 @@
+import os
+import json
+import hmac
+import time
+import queue
+import socket
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Флот: применение пресетов на многих компьютерах ---
+# Агент (optimizer agent) слушает TCP-порт и выполняет пакеты твиков своим локальным движком.
+# Контроллер (optimizer fleet, окно "Флот") держит пул постоянных соединений с агентами,
+# рассылает пресет сразу на fanout агентов и получает вывод каждого по мере выполнения.
+# Протокол - JSON-строки: запрос {"id", "op", ...}, ответы {"id", "event", ...}, последний ответ - "done".
+# Пресет - {"categories": [...], "tweaks": [...], "parallel", "timeout", "force", "coalesce"};
+# твики выбираются из каталога агента, поэтому пути указываются относительно его папки.
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 47800
+DEFAULT_FANOUT = 16
+CONNECT_TIMEOUT = 5.0
+TOKEN_ENV = "OPTIMIZER_FLEET_TOKEN"
+MAX_MESSAGE = 4 * 1024 * 1024
+SEND_QUEUE = 10000
+SEND_BATCH = 512
+CLOSE_TIMEOUT = 5.0
+PRESET_KEYS = ("categories", "tweaks", "parallel", "timeout", "force", "coalesce")
+
+
+class FleetError(Exception):
+    pass
+
+
+def _encode(obj):
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def parse_address(text, default_port=DEFAULT_PORT):
+    # "host", "host:port", "[::1]:port" -> (host, port); ValueError, если адрес не разобрать
+    text = text.strip()
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        port = int(rest[1:]) if rest.startswith(":") else default_port
+    elif text.count(":") == 1:
+        host, port = text.split(":")
+        port = int(port)
+    else:
+        host, port = text, default_port
+    if not host or not 0 < port < 65536:
+        raise ValueError(f"неверный адрес агента: {text}")
+    return host, port
+
+
+def format_address(address):
+    host, port = address
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+
+def read_hosts(path):
+    # Файл со списком агентов: по одному на строку, "#" - комментарий
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def make_preset(categories=(), tweaks=(), parallel=1, timeout=None, force=False, coalesce=False):
+    return {"categories": list(categories), "tweaks": list(tweaks), "parallel": parallel, "timeout": timeout,
+            "force": force, "coalesce": coalesce}
+
+
+def load_preset(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise FleetError(f"{path}: пресет должен быть JSON-объектом")
+    preset = make_preset()
+    preset.update((k, data[k]) for k in PRESET_KEYS if k in data)
+    return preset
+
+
+def is_loopback(host):
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except OSError:
+        return False
+    return all(info[4][0].startswith("127.") or info[4][0] == "::1" for info in infos)
+
+
+# --- Агент ---
+
+class _Sender:
+    # Отдельный поток записи: движок не ждёт сеть, а подряд идущие события уходят одним send
+    def __init__(self, sock):
+        self.sock = sock
+        self.queue = queue.Queue(maxsize=SEND_QUEUE)
+        self.closed = False
+        self.thread = threading.Thread(target=self._loop, name="fleet-send", daemon=True)
+        self.thread.start()
+
+    def send(self, obj):
+        # Полная очередь притормаживает пакет, пока контроллер не дочитает; после закрытия - отбрасываем
+        data = _encode(obj)
+        while not self.closed:
+            try:
+                self.queue.put(data, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _loop(self):
+        while not self.closed:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < SEND_BATCH:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(batch)
+                    return
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        if self.closed:
+            return
+        try:
+            self.sock.sendall(b"".join(batch))
+        except OSError:
+            # контроллер отключился - дальнейшие события просто отбрасываются
+            self.closed = True
+
+    def close(self):
+        # Не ждём места в очереди: контроллер мог перестать читать, а поток записи - застрять в sendall
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.thread.join(timeout=CLOSE_TIMEOUT)
+        self.closed = True
+        if self.thread.is_alive():
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.thread.join(timeout=CLOSE_TIMEOUT)
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        agent = self.server.agent
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sender = _Sender(self.request)
+        authed = not agent.token
+        try:
+            while True:
+                raw = self.rfile.readline(MAX_MESSAGE)
+                if not raw:
+                    return
+                try:
+                    msg = json.loads(raw)
+                    rid, op = msg.get("id"), msg.get("op")
+                except (ValueError, AttributeError):
+                    sender.send({"id": None, "event": "error", "error": "неверный формат запроса"})
+                    return
+                if op == "hello":
+                    if not agent.check_token(msg.get("token")):
+                        sender.send({"id": rid, "event": "error", "error": "неверный токен"})
+                        return
+                    authed = True
+                    sender.send(dict(agent.info(), id=rid, event="hello"))
+                    sender.send({"id": rid, "event": "done"})
+                elif not authed:
+                    sender.send({"id": rid, "event": "error", "error": "нужна авторизация (hello)"})
+                    return
+                elif op == "ping":
+                    sender.send({"id": rid, "event": "pong", "busy": agent.busy})
+                    sender.send({"id": rid, "event": "done"})
+                elif op == "list":
+                    sender.send({"id": rid, "event": "catalog", "categories": agent.categories()})
+                    sender.send({"id": rid, "event": "done"})
+                elif op == "run":
+                    # пакет идёт в своём потоке, чтобы по этому же соединению можно было прислать cancel
+                    agent.start_run(rid, msg.get("preset") or {}, sender.send)
+                elif op == "cancel":
+                    agent.cancel()
+                    sender.send({"id": rid, "event": "done"})
+                else:
+                    sender.send({"id": rid, "event": "error", "error": f"неизвестная операция: {op}"})
+                    sender.send({"id": rid, "event": "done"})
+        finally:
+            # запущенный пакет доводится до конца и без контроллера - результаты остаются в журнале агента
+            sender.close()
+
+
+class _AgentServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FleetAgent:
+    # Пакеты выполняются по одному: второй run, пока идёт первый, получает ошибку "занят"
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, token=None):
+        self.token = token or ""
+        self.server = _AgentServer((host, port), _AgentHandler)
+        self.server.agent = self
+        self.address = self.server.server_address[:2]
+        self.hostname = socket.gethostname()
+        self._lock = threading.Lock()
+        self._run_thread = None
+        self._cancel = threading.Event()
+
+    def check_token(self, token):
+        return hmac.compare_digest((token or "").encode("utf-8"), self.token.encode("utf-8"))
+
+    def info(self):
+        return {"host": self.hostname, "pid": os.getpid(), "version": PROTOCOL_VERSION, "busy": self.busy}
+
+    @property
+    def busy(self):
+        return self._run_thread is not None and self._run_thread.is_alive()
+
+    def categories(self):
+        from core import load_catalog
+        catalog = load_catalog()
+        return {cat: len(catalog.folder(cat)) for cat in sorted(catalog.folders())}
+
+    def start_run(self, rid, preset, send):
+        with self._lock:
+            if self.busy:
+                send({"id": rid, "event": "error", "error": "агент занят другим пакетом"})
+                send({"id": rid, "event": "done"})
+                return
+            self._cancel.clear()
+            self._run_thread = threading.Thread(target=self._run, args=(rid, preset, send), name="fleet-run", daemon=True)
+            self._run_thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self, rid, preset, send):
+        try:
+            self._run_preset(rid, preset, send)
+        except Exception as e:
+            send({"id": rid, "event": "error", "error": str(e)})
+        send({"id": rid, "event": "done"})
+
+    def _run_preset(self, rid, preset, send):
+        from core import load_catalog, select_tweaks, run_batch
+        tweaks = select_tweaks(load_catalog(), preset.get("categories") or (), preset.get("tweaks") or ())
+        if not tweaks:
+            send({"id": rid, "event": "error", "error": "не найдено ни одного твика для запуска"})
+            return
+        send({"id": rid, "event": "batch_start", "total": len(tweaks)})
+        started = {}
+        counts = {"ok": 0, "failed": 0, "skipped": 0}
+
+        def on_event(kind, tw, data):
+            if kind == "start":
+                started[tw.path] = time.monotonic()
+                send({"id": rid, "event": "start", "tweak": tw.path})
+            elif kind == "line":
+                send({"id": rid, "event": "line", "tweak": tw.path, "stream": data[0], "text": data[1]})
+            elif kind == "timeout":
+                send({"id": rid, "event": "timeout", "tweak": tw.path, "timeout": data})
+            elif kind == "skipped":
+                counts["skipped"] += 1
+                counts["ok"] += 1
+                send({"id": rid, "event": "skipped", "tweak": tw.path, "reason": data})
+            elif kind in ("exit", "error"):
+                counts["ok" if kind == "exit" and data == 0 else "failed"] += 1
+                duration = time.monotonic() - started.get(tw.path, time.monotonic())
+                send({"id": rid, "event": kind, "tweak": tw.path, "code": data if kind == "exit" else None,
+                      "error": data if kind == "error" else None, "duration": round(duration, 3)})
+            elif kind == "progress":
+                send({"id": rid, "event": "progress", "done": data[0], "total": data[1]})
+
+        batch_started = time.monotonic()
+        cancelled = run_batch(tweaks, on_event, max_workers=max(1, int(preset.get("parallel") or 1)),
+                              default_timeout=preset.get("timeout"), force=bool(preset.get("force")),
+                              coalesce=bool(preset.get("coalesce")), cancel_event=self._cancel)
+        send(dict(counts, id=rid, event="summary", host=self.hostname, total=len(tweaks), cancelled=cancelled,
+                  duration=round(time.monotonic() - batch_started, 3)))
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever(poll_interval=0.5)
+        finally:
+            self.server.server_close()
+
+    def start(self):
+        # Фоновый запуск (для проверки нескольких агентов в одном процессе)
+        threading.Thread(target=self.serve_forever, name="fleet-agent", daemon=True).start()
+        return self
+
+    def shutdown(self):
+        self.cancel()
+        self.server.shutdown()
+
+
+# --- Контроллер ---
+
+class AgentConnection:
+    # Постоянное соединение с одним агентом. Запросы выполняются по одному (lock),
+    # cancel можно отправить параллельно - ответы разбираются по id.
+    def __init__(self, address, token=None, connect_timeout=CONNECT_TIMEOUT):
+        self.address = address
+        self.label = format_address(address)
+        self.token = token or ""
+        self.connect_timeout = connect_timeout
+        self.info = {}
+        self.sock = None
+        self._rfile = None
+        self._lock = threading.Lock()
+        self._wlock = threading.Lock()
+        self._ids = 0
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.sock = sock
+        self._rfile = sock.makefile("rb")
+        try:
+            for msg in self._exchange("hello", {"token": self.token}):
+                if msg.get("event") == "error":
+                    raise FleetError(msg.get("error"))
+                if msg.get("event") == "hello":
+                    self.info = {k: v for k, v in msg.items() if k not in ("id", "event")}
+        except Exception:
+            self.close()
+            raise
+        # пакет на агенте может идти долго - дальше читаем без таймаута, обрыв ловит keepalive
+        sock.settimeout(None)
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                self._rfile.close()
+                sock.close()
+            except OSError:
+                pass
+
+    def _send(self, op, fields):
+        with self._wlock:
+            # close() из читающего потока может обнулить sock в любой момент - работаем с копией
+            sock = self.sock
+            if sock is None:
+                raise OSError("соединение закрыто")
+            self._ids += 1
+            rid = self._ids
+            sock.sendall(_encode(dict(fields, id=rid, op=op)))
+        return rid
+
+    def _exchange(self, op, fields):
+        rid = self._send(op, fields)
+        while True:
+            raw = self._rfile.readline(MAX_MESSAGE)
+            if not raw:
+                self.close()
+                raise FleetError("агент закрыл соединение")
+            msg = json.loads(raw)
+            if msg.get("id") not in (rid, None):
+                continue  # ответ на cancel и т.п.
+            if msg.get("event") == "done":
+                return
+            if msg.get("event") == "error" and msg.get("id") is None:
+                self.close()
+                raise FleetError(msg.get("error"))
+            yield msg
+
+    def request(self, op, **fields):
+        # Генератор ответов агента. Если соединение из пула успело оборваться (агент перезапущен),
+        # переподключаемся один раз; на свежем соединении ошибка сразу уходит вызывающему.
+        with self._lock:
+            while True:
+                reused = self.sock is not None
+                try:
+                    if not reused:
+                        self.connect()
+                    rid_stream = self._exchange(op, fields)
+                    first = next(rid_stream, None)
+                    break
+                except (OSError, FleetError, ValueError):
+                    self.close()
+                    if not reused:
+                        raise
+            if first is None:
+                return
+            try:
+                yield first
+                yield from rid_stream
+            except (OSError, ValueError) as e:
+                self.close()
+                raise FleetError(str(e)) from e
+
+    def cancel(self):
+        # Вызывается из другого потока, пока request("run") читает события; закрытое соединение - отменять нечего
+        try:
+            self._send("cancel", {})
+        except OSError:
+            pass
+
+
+class HostResult:
+    __slots__ = ("address", "host", "total", "ok", "failed", "skipped", "cancelled", "duration", "error")
+
+    def __init__(self, address):
+        self.address = address
+        self.host = None
+        self.total = 0
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.cancelled = False
+        self.duration = 0.0
+        self.error = None
+
+    @property
+    def success(self):
+        return self.error is None and self.failed == 0 and not self.cancelled
+
+    def as_dict(self):
+        return {"agent": self.address, "host": self.host, "total": self.total, "ok": self.ok, "failed": self.failed,
+                "skipped": self.skipped, "cancelled": self.cancelled, "duration": self.duration, "error": self.error}
+
+
+def aggregate(results):
+    results = list(results)
+    return {"agents": len(results), "agents_ok": sum(1 for r in results if r.success),
+            "agents_failed": sum(1 for r in results if r.error is None and not r.success),
+            "agents_unreachable": sum(1 for r in results if r.error is not None),
+            "tweaks_ok": sum(r.ok for r in results), "tweaks_failed": sum(r.failed for r in results),
+            "tweaks_skipped": sum(r.skipped for r in results)}
+
+
+class FleetPool:
+    # Соединения создаются при первом обращении и переиспользуются между рассылками
+    def __init__(self, token=None, fanout=DEFAULT_FANOUT, connect_timeout=CONNECT_TIMEOUT):
+        self.token = token
+        self.fanout = fanout
+        self.connect_timeout = connect_timeout
+        self._conns = {}
+        self._lock = threading.Lock()
+        self._active = set()
+        self._cancel = threading.Event()
+
+    def connection(self, address):
+        if isinstance(address, str):
+            address = parse_address(address)
+        with self._lock:
+            conn = self._conns.get(address)
+            if conn is None:
+                conn = self._conns[address] = AgentConnection(address, self.token, self.connect_timeout)
+            return conn
+
+    def dispatch(self, addresses, preset, on_event=None):
+        # on_event(агент, сообщение) вызывается из рабочих потоков; возвращает [HostResult] в порядке addresses
+        self._cancel.clear()
+        conns = [self.connection(a) for a in addresses]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.fanout, len(conns))), thread_name_prefix="fleet") as pool:
+            return list(pool.map(lambda conn: self._run_one(conn, preset, on_event), conns))
+
+    def _run_one(self, conn, preset, on_event):
+        result = HostResult(conn.label)
+        if self._cancel.is_set():
+            result.cancelled = True
+            result.error = "отменено до отправки"
+            return result
+        started = time.monotonic()
+        with self._lock:
+            self._active.add(conn)
+        try:
+            for msg in conn.request("run", preset=preset):
+                event = msg.get("event")
+                if event == "summary":
+                    for key in ("total", "ok", "failed", "skipped", "cancelled"):
+                        setattr(result, key, msg.get(key, getattr(result, key)))
+                elif event == "error" and "tweak" not in msg:
+                    result.error = msg.get("error")
+                if on_event is not None:
+                    on_event(conn.label, msg)
+        except (OSError, FleetError) as e:
+            result.error = str(e) or e.__class__.__name__
+            if on_event is not None:
+                on_event(conn.label, {"event": "error", "error": result.error})
+        finally:
+            with self._lock:
+                self._active.discard(conn)
+        result.host = conn.info.get("host")
+        result.duration = round(time.monotonic() - started, 3)
+        return result
+
+    def cancel(self):
+        self._cancel.set()
+        with self._lock:
+            active = list(self._active)
+        for conn in active:
+            conn.cancel()
+
+    def ping(self, addresses):
+        # {агент: info или текст ошибки}; заодно прогревает соединения
+        def one(conn):
+            try:
+                for msg in conn.request("ping"):
+                    conn.info["busy"] = msg.get("busy")
+                return conn.label, dict(conn.info)
+            except (OSError, FleetError) as e:
+                return conn.label, str(e) or e.__class__.__name__
+        conns = [self.connection(a) for a in addresses]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.fanout, len(conns))), thread_name_prefix="fleet") as pool:
+            return dict(pool.map(one, conns))
+
+    def close(self):
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+        for conn in conns:
+            conn.close()
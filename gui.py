@@ -0,0 +1,991 @@
+import os
+import queue
+import threading
+import bisect
+import subprocess
+import customtkinter as ctk
+from tkinter import messagebox, filedialog, END, Listbox, SINGLE, MULTIPLE, ttk
+import time
+import webbrowser
+from PIL import Image
+from catalog import CatalogIndex, TweakCatalog, start_background_scan
+from watcher import CatalogWatcher
+from engine import BatchRunner
+from terminal import TerminalSink
+from search import SearchIndex, MAX_HITS
+from preview import PreviewLoader, BINARY_EXTS
+from treesync import sync_tree_rows
+from profiler import get_profiler, profiled, LagMonitor
+from fleet import FleetPool, FleetError, make_preset, parse_address, format_address, DEFAULT_FANOUT, TOKEN_ENV
+from core import (TWEAKS_DIR, INDEX_FILE, SEARCH_INDEX_FILE, RUNS_DIR, DEFAULT_WORKERS, SUPPORTED_EXTS,
+                  sort_tweaks, save_settings, load_settings, get_tweak_info, get_run_logger, get_history,
+                  get_manifest)
+
+# --- Настройки интерфейса ---
+ctk.set_appearance_mode("dark")
+ctk.set_default_color_theme("blue")
+
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_POLL_MS = 15
+ICON_PATH = None  # Можно добавить путь к иконке, если есть
+PREFETCH_ROWS = 5
+WATCH_POLL_MS = 250
+APPLY_STATUS = {"applied": "✓ применён", "changed": "изменён"}
+FLEET_POLL_MS = 50
+PROFILE_REFRESH_MS = 1000
+
+# --- Цвета типов твиков ---
+EXT_COLORS = {
+    ".exe": "#22c55e",  # зелёный
+    ".bat": "#3b82f6",  # синий
+    ".cmd": "#3b82f6",
+    ".vbs": "#a21caf",  # фиолетовый
+    ".ps1": "#f59e42",  # оранжевый
+    ".reg": "#a16207",  # коричневый
+    ".pow": "#eab308",  # жёлтый
+}
+DEFAULT_EXT_COLOR = "#64748b"  # серый
+
+# --- Окно флота ---
+class FleetWindow(ctk.CTkToplevel):
+    # Рассылка выбранных твиков на агентов; пул соединений живёт, пока открыто окно
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Флот")
+        self.geometry("900x640")
+        self.pool = None
+        self.events = queue.Queue()
+        self.busy = False
+        top = ctk.CTkFrame(self, fg_color="transparent")
+        top.pack(fill="x", padx=12, pady=(12, 4))
+        ctk.CTkLabel(top, text="Агенты (host:port, по одному на строку):", font=("Segoe UI", 12)).pack(anchor="w")
+        self.hosts_box = ctk.CTkTextbox(top, height=90, font=("Consolas", 12))
+        self.hosts_box.pack(fill="x", pady=(2, 6))
+        self.hosts_box.insert("end", "\n".join(app.settings.get("fleet_hosts", [])))
+        row = ctk.CTkFrame(top, fg_color="transparent")
+        row.pack(fill="x")
+        ctk.CTkLabel(row, text="Токен:", font=("Segoe UI", 12)).pack(side="left", padx=(0, 5))
+        self.token_var = ctk.StringVar(value=os.environ.get(TOKEN_ENV, ""))
+        ctk.CTkEntry(row, textvariable=self.token_var, show="*", width=160).pack(side="left")
+        ctk.CTkLabel(row, text="Одновременно:", font=("Segoe UI", 12)).pack(side="left", padx=(16, 5))
+        self.fanout_var = ctk.StringVar(value=str(app.settings.get("fleet_fanout", DEFAULT_FANOUT)))
+        ctk.CTkOptionMenu(row, variable=self.fanout_var, values=["1", "4", "16", "64", "256"], width=80).pack(side="left")
+        self.cancel_btn = ctk.CTkButton(row, text="Отмена", width=80, command=self.cancel, state="disabled")
+        self.cancel_btn.pack(side="right", padx=4)
+        self.send_btn = ctk.CTkButton(row, text="Отправить выбранные твики", width=200, command=self.send_selected)
+        self.send_btn.pack(side="right", padx=4)
+        self.ping_btn = ctk.CTkButton(row, text="Проверить", width=100, command=self.ping)
+        self.ping_btn.pack(side="right", padx=4)
+        self.status_tree = ttk.Treeview(self, columns=("agent", "host", "state", "progress", "failed"), show="headings", height=6)
+        for col, text, width in (("agent", "Агент", 200), ("host", "Компьютер", 180), ("state", "Состояние", 260),
+                                 ("progress", "Выполнено", 100), ("failed", "Ошибки", 80)):
+            self.status_tree.heading(col, text=text)
+            self.status_tree.column(col, width=width, anchor="w")
+        self.status_tree.pack(fill="x", padx=12, pady=6)
+        self.output_box = ctk.CTkTextbox(self, font=("Consolas", 12), wrap="none")
+        self.output_box.pack(fill="both", expand=True, padx=12, pady=(0, 12))
+        self.output_box.configure(state="disabled")
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+
+    def _hosts(self):
+        hosts = []
+        for line in self.hosts_box.get("1.0", "end").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                hosts.append(format_address(parse_address(line)))
+            except ValueError:
+                self._write(f"[{line}] неверный адрес, пропущен")
+        hosts = list(dict.fromkeys(hosts))
+        self.app.settings["fleet_hosts"] = hosts
+        self.app.settings["fleet_fanout"] = int(self.fanout_var.get())
+        save_settings(self.app.settings)
+        return hosts
+
+    def _pool(self):
+        # Пул пересоздаётся только при смене токена - соединения переиспользуются между рассылками
+        token = self.token_var.get()
+        if self.pool is None or self.pool.token != token:
+            if self.pool is not None:
+                self.pool.close()
+            self.pool = FleetPool(token)
+        self.pool.fanout = int(self.fanout_var.get())
+        return self.pool
+
+    def _start(self, hosts, target):
+        self.busy = True
+        self.send_btn.configure(state="disabled")
+        self.ping_btn.configure(state="disabled")
+        self.status_tree.delete(*self.status_tree.get_children())
+        for agent in hosts:
+            self.status_tree.insert("", "end", iid=agent, values=(agent, "", "ожидание", "", ""))
+        threading.Thread(target=target, name="fleet-dispatch", daemon=True).start()
+        self.after(FLEET_POLL_MS, self._poll)
+
+    def ping(self):
+        hosts = self._hosts()
+        if self.busy or not hosts:
+            return
+        pool = self._pool()
+        self._start(hosts, lambda: self.events.put(("ping", None, pool.ping(hosts))))
+
+    def send_selected(self):
+        hosts = self._hosts()
+        if self.busy or not hosts:
+            return
+        tweaks = self.app.catalog.resolve(self.app.tweaks_tree.selection())
+        if not tweaks:
+            messagebox.showwarning("Нет твиков", "Выберите в главном окне твики для рассылки.", parent=self)
+            return
+        preset = make_preset(tweaks=[tw.path for tw in tweaks], parallel=int(self.app.workers_var.get()),
+                             timeout=self.app.settings.get("tweak_timeout"), force=self.app.force_var.get(),
+                             coalesce=self.app.coalesce_var.get())
+        pool = self._pool()
+        self._write(f"Рассылка {len(tweaks)} твиков на {len(hosts)} агентов")
+        self.cancel_btn.configure(state="normal")
+
+        def worker():
+            try:
+                results = pool.dispatch(hosts, preset, lambda agent, msg: self.events.put(("event", agent, msg)))
+            except (OSError, FleetError) as e:
+                results = []
+                self.events.put(("event", None, {"event": "error", "error": str(e)}))
+            self.events.put(("done", None, results))
+        self._start(hosts, worker)
+
+    def cancel(self):
+        if self.pool is not None:
+            self.pool.cancel()
+        self.cancel_btn.configure(state="disabled")
+        self._write("[CANCEL] Остановка на агентах...")
+
+    def _set(self, agent, **values):
+        if agent and self.status_tree.exists(agent):
+            for col, value in values.items():
+                self.status_tree.set(agent, col, value)
+
+    def _poll(self):
+        # Вывод всех агентов собирается за тик и дописывается в окно одной вставкой
+        lines = []
+        finished = None
+        for _ in range(2000):
+            try:
+                kind, agent, data = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "ping":
+                for label, info in data.items():
+                    if isinstance(info, dict):
+                        self._set(label, host=info.get("host", ""), state="занят" if info.get("busy") else "на связи")
+                    else:
+                        self._set(label, state=f"нет связи: {info}")
+                finished = []
+                break
+            if kind == "done":
+                finished = data
+                break
+            event = data.get("event")
+            name = os.path.basename(data.get("tweak") or "")
+            if event == "batch_start":
+                self._set(agent, state="выполняется", progress=f"0 / {data.get('total')}", failed=0)
+            elif event == "progress":
+                self._set(agent, progress=f"{data.get('done')} / {data.get('total')}")
+            elif event == "line":
+                lines.append(f"[{agent}] [{name}] {data.get('text')}")
+            elif event == "skipped":
+                lines.append(f"[{agent}] [SKIP] {name} {data.get('reason')}, пропущен")
+            elif event == "timeout":
+                lines.append(f"[{agent}] [TIMEOUT] {name} превысил лимит {data.get('timeout')} с")
+            elif event == "exit":
+                lines.append(f"[{agent}] [OK] {name}" if data.get("code") == 0 else f"[{agent}] [ERR {data.get('code')}] {name}")
+            elif event == "error":
+                lines.append(f"[{agent or 'флот'}] [EXCEPTION] {name + ': ' if name else ''}{data.get('error')}")
+                if not name:
+                    self._set(agent, state=f"ошибка: {data.get('error')}")
+            elif event == "summary":
+                self._set(agent, state="отменено" if data.get("cancelled") else "готово",
+                          progress=f"{data.get('ok')} / {data.get('total')}", failed=data.get("failed"))
+        if lines:
+            self._write("\n".join(lines))
+        if finished is None:
+            self.after(FLEET_POLL_MS, self._poll)
+            return
+        self.busy = False
+        self.send_btn.configure(state="normal")
+        self.ping_btn.configure(state="normal")
+        self.cancel_btn.configure(state="disabled")
+        for r in finished:
+            self._set(r.address, host=r.host or "")
+        if finished:
+            ok = sum(1 for r in finished if r.success)
+            self._write(f"Готово: без ошибок {ok} из {len(finished)} агентов")
+
+    def _write(self, text):
+        self.output_box.configure(state="normal")
+        self.output_box.insert("end", text + "\n")
+        self.output_box.see("end")
+        self.output_box.configure(state="disabled")
+
+    def destroy(self):
+        if self.pool is not None:
+            self.pool.cancel()
+            self.pool.close()
+        self.app.fleet_window = None
+        super().destroy()
+
+# --- Окно профилирования ---
+class ProfileWindow(ctk.CTkToplevel):
+    # Сводка по интервалам и задержке главного цикла, выгрузка трассы для отчёта об ошибке
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.profiler = get_profiler()
+        self.title("Профилирование")
+        self.geometry("820x560")
+        top = ctk.CTkFrame(self, fg_color="transparent")
+        top.pack(fill="x", padx=12, pady=(12, 4))
+        self.enabled_var = ctk.BooleanVar(value=self.profiler.enabled)
+        ctk.CTkCheckBox(top, text="Профилирование включено", variable=self.enabled_var, font=("Segoe UI", 12),
+                        command=lambda: app.change_profiling(self.enabled_var.get())).pack(side="left")
+        ctk.CTkButton(top, text="speedscope...", width=110, command=lambda: self.export(".speedscope.json")).pack(side="right", padx=4)
+        ctk.CTkButton(top, text="Chrome trace...", width=120, command=lambda: self.export(".json")).pack(side="right", padx=4)
+        ctk.CTkButton(top, text="Сбросить", width=90, command=self.reset).pack(side="right", padx=4)
+        self.summary_box = ctk.CTkTextbox(self, font=("Consolas", 12), wrap="none")
+        self.summary_box.pack(fill="both", expand=True, padx=12, pady=(4, 12))
+        self._after = None
+        self._exports = queue.Queue()
+        self.refresh()
+
+    def refresh(self):
+        self._report_exports()
+        lines = [f"{'Интервал':<28}{'вызовов':>9}{'всего, мс':>12}{'среднее':>10}{'p50':>10}{'p95':>10}{'макс.':>10}"]
+        for st in self.profiler.summary():
+            lines.append(f"{st.name[:27]:<28}{st.count:>9}{st.total * 1000:>12.1f}{st.mean * 1000:>10.2f}"
+                         f"{st.p50 * 1000:>10.2f}{st.p95 * 1000:>10.2f}{st.max * 1000:>10.2f}")
+        count, p50, p95, worst, slow = self.app.lag_monitor.stats()
+        lines.append("")
+        lines.append(f"Задержка главного цикла ({count} замеров): медиана {p50 * 1000:.1f} мс, p95 {p95 * 1000:.1f} мс, "
+                     f"макс. {worst * 1000:.1f} мс, выше {self.app.lag_monitor.threshold * 1000:.0f} мс: {slow}")
+        if not self.profiler.enabled:
+            lines.append("Профилирование выключено - новые данные не собираются.")
+        self.summary_box.configure(state="normal")
+        self.summary_box.delete("1.0", "end")
+        self.summary_box.insert("end", "\n".join(lines))
+        self.summary_box.configure(state="disabled")
+        self._after = self.after(PROFILE_REFRESH_MS, self.refresh)
+
+    def reset(self):
+        self.profiler.clear()
+        self.app.lag_monitor.samples.clear()
+
+    def export(self, suffix):
+        name = time.strftime("optimizer-trace-%Y%m%d-%H%M%S") + suffix
+        path = filedialog.asksaveasfilename(parent=self, initialfile=name, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        if suffix == ".speedscope.json" and not path.lower().endswith(suffix):
+            path = os.path.splitext(path)[0] + suffix
+
+        def worker():
+            # сборка трассы на сотни тысяч событий занимает заметное время - не в потоке Tk
+            try:
+                self._exports.put((self.profiler.export(path), None))
+            except OSError as e:
+                self._exports.put((path, e))
+
+        threading.Thread(target=worker, name="profile-export", daemon=True).start()
+
+    def _report_exports(self):
+        while True:
+            try:
+                path, error = self._exports.get_nowait()
+            except queue.Empty:
+                return
+            if error is not None:
+                messagebox.showerror("Профилирование", f"Не удалось сохранить трассу: {error}", parent=self)
+            else:
+                self.app.print_terminal(f"Трасса сохранена: {path}")
+
+    def destroy(self):
+        if self._after is not None:
+            self.after_cancel(self._after)
+        self.app.profile_window = None
+        super().destroy()
+
+# --- GUI ---
+class TweakOptimizerApp(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+        self.title("Windows Tweaks Optimizer")
+        if ICON_PATH and os.path.exists(ICON_PATH):
+            self.iconbitmap(ICON_PATH)
+        self.geometry("1200x800+379+107")
+        self.resizable(False, False)
+        self.settings = load_settings()
+        self.profiler = get_profiler()
+        if self.settings.get("profiling"):
+            self.profiler.enable()
+        self.lag_monitor = LagMonitor(self)
+        self.profile_window = None
+        # --- Каталог: сначала из индекса на диске, затем фоновая досканировка ---
+        self.catalog_index = CatalogIndex(TWEAKS_DIR, INDEX_FILE, SUPPORTED_EXTS)
+        self.catalog_index.load()
+        self.catalog = TweakCatalog(self.catalog_index.tweaks())
+        self.sorted_categories = sorted(self.catalog.folders())
+        self.selected_category = self.sorted_categories[0] if self.sorted_categories else None
+        # --- Переменные поиска и сортировки (создаём до update_tweaks_list) ---
+        self.search_var = ctk.StringVar()
+        self.sort_var = ctk.StringVar(value="По имени")
+        self.search_index = SearchIndex(SEARCH_INDEX_FILE)
+        self._search_after = None
+        self._search_stop = threading.Event()
+        self._query_stop = threading.Event()
+        self._query_gen = 0
+        self._query_after = None
+        self._query_results = queue.Queue()
+        self._search_busy = False
+        self._search_again = False
+        self.watcher = None
+        self.stats = {}
+        self._stats_busy = True
+        self.manifest = get_manifest()
+        self._status_jobs = 0
+        self._status_pending = set()
+        self._polling = False
+        self._sort_cache = {}
+        self._tree_rows = []
+        self.preview = PreviewLoader()
+        self.fleet_window = None
+        self._build_ui()
+        self.load_user_settings()
+        self.runner = None
+        self._run_events = queue.Queue()
+        self._run_errors = []
+        self._catalog_queue = queue.Queue()
+        self._catalog_busy = True
+        self._catalog_scan = start_background_scan(
+            self.catalog_index,
+            on_folder=lambda rel, tws: self._catalog_queue.put(("folder", rel, tws)),
+            on_done=lambda result: self._catalog_queue.put(("done", result, None)),
+        )
+        threading.Thread(target=lambda: self._catalog_queue.put(("stats", get_history().stats(), None)),
+                         name="history-stats", daemon=True).start()
+        self._kick_catalog_poll()
+        if self.profiler.enabled:
+            self.lag_monitor.start()
+
+    def _kick_catalog_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.after(30, self._poll_catalog_queue)
+
+    @profiled("poll_catalog_queue")
+    def _poll_catalog_queue(self):
+        current = self.get_selected_category()
+        refresh = False
+        while True:
+            try:
+                kind, a, b = self._catalog_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "folder":
+                refresh |= self._apply_catalog_folder(a, b) and a == current
+            elif kind == "done":
+                self._catalog_busy = False
+                if a is not None:
+                    for cat in [c for c in self.sorted_categories if c not in a]:
+                        refresh |= cat == current
+                        self._remove_category(cat)
+                self._start_search_index()
+                self._start_watcher()
+            elif kind == "changes":
+                refresh |= self._apply_catalog_changes(a, current)
+            elif kind == "search":
+                self._search_busy = False
+                refresh |= bool(self.search_var.get().strip())
+                if self._search_again:
+                    self._search_again = False
+                    self._start_search_index()
+            elif kind == "stats":
+                self._stats_busy = False
+                self.apply_stats(a)
+            elif kind == "status":
+                self._status_jobs -= 1
+                self._status_pending.difference_update(a)
+                self._update_rows(a)
+        if refresh or self.get_selected_category() != current:
+            self.update_tweaks_list()
+        if self._catalog_busy or self._search_busy or self._stats_busy or self._status_jobs:
+            self.after(50, self._poll_catalog_queue)
+        elif self.watcher is not None:
+            # изменения от наблюдателя приходят в любой момент - опрашиваем очередь реже
+            self.after(WATCH_POLL_MS, self._poll_catalog_queue)
+        else:
+            self._polling = False
+
+    def _start_watcher(self):
+        # Наблюдение за папкой твиков включается после первого сканирования (настройка watch_tweaks)
+        if self.watcher is not None or not self.settings.get("watch_tweaks", True):
+            return
+        self.watcher = CatalogWatcher(self.catalog_index,
+                                      on_change=lambda changes: self._catalog_queue.put(("changes", changes, None)))
+        self.watcher.start()
+
+    def _apply_catalog_changes(self, changes, current):
+        # Пакет изменений от наблюдателя: обновляются только затронутые категории,
+        # строки списка затем синхронизируются через sync_tree_rows
+        refresh = False
+        for cat, tws in changes.items():
+            if tws:
+                refresh |= self._apply_catalog_folder(cat, tws) and cat == current
+            elif cat in self.catalog:
+                refresh |= cat == current
+                self._remove_category(cat)
+        if self._search_busy:
+            self._search_again = True
+        else:
+            self._start_search_index()
+        return refresh or bool(self.search_var.get().strip())
+
+    def _start_search_index(self):
+        # Индекс поиска строится в фоне по снимку каталога; неизменённые файлы не перечитываются
+        self._search_busy = True
+        snapshot = self.catalog.snapshot()
+
+        def worker():
+            try:
+                with self.profiler.span("search.index", "catalog"):
+                    self.search_index.update(snapshot, self._search_stop)
+            finally:
+                self._catalog_queue.put(("search", None, None))
+
+        threading.Thread(target=worker, name="search-index", daemon=True).start()
+
+    def _apply_catalog_folder(self, cat, tws):
+        if self.catalog.folder(cat) is tws:
+            return False
+        self.catalog.set_folder(cat, tws)
+        if cat not in self.sorted_categories:
+            pos = bisect.bisect_left(self.sorted_categories, cat)
+            self.sorted_categories.insert(pos, cat)
+            self.category_listbox.insert(pos, cat)
+            if not self.category_listbox.curselection():
+                self.selected_category = self.selected_category or cat
+                self.category_listbox.select_set(self.sorted_categories.index(self.selected_category))
+        return True
+
+    def _remove_category(self, cat):
+        pos = self.sorted_categories.index(cat)
+        del self.sorted_categories[pos]
+        self.category_listbox.delete(pos)
+        self.catalog.remove_folder(cat)
+        if self.selected_category == cat:
+            self.selected_category = self.sorted_categories[0] if self.sorted_categories else None
+        if self.selected_category and not self.category_listbox.curselection():
+            self.category_listbox.select_set(self.sorted_categories.index(self.selected_category))
+
+    def _build_ui(self):
+        # --- Верхняя подпись ---
+        self.header = ctk.CTkLabel(self, text="UI Created by Faliseven  |  Tweaks Created by scode18", font=("Segoe UI", 13, "bold"), text_color="#3b82f6")
+        self.header.pack(side="top", pady=(10, 0))
+
+        # --- Переключатель темы ---
+        theme_frame = ctk.CTkFrame(self, fg_color="transparent")
+        theme_frame.place(relx=0.99, rely=0.01, anchor="ne")
+        ctk.CTkLabel(theme_frame, text="Тема:", font=("Segoe UI", 11)).pack(side="left", padx=(0, 2))
+        self.theme_var = ctk.StringVar(value=self.settings.get("theme", "dark"))
+        self.theme_switch = ctk.CTkOptionMenu(theme_frame, variable=self.theme_var, values=["dark", "light"], width=70, command=self.change_theme)
+        self.theme_switch.pack(side="left")
+
+        # --- Основной фрейм ---
+        main_frame = ctk.CTkFrame(self, width=1200, height=800)
+        main_frame.pack(fill="both", expand=True, padx=0, pady=(8,0))
+
+        # --- Список категорий слева ---
+        self.sidebar = ctk.CTkFrame(main_frame, width=260, height=700, corner_radius=18)
+        self.sidebar.pack(side="left", fill="y", padx=(18,0), pady=18)
+        ctk.CTkLabel(self.sidebar, text="Категории (папки)", font=("Segoe UI", 18, "bold")).pack(pady=(14,7))
+        self.category_listbox = Listbox(self.sidebar, selectmode=SINGLE, exportselection=False, width=28, height=32, font=("Segoe UI", 13), bg="#232a36", fg="#e0e0e0", highlightthickness=0, relief="flat", selectbackground="#3b82f6", selectforeground="#fff")
+        self.category_listbox.pack(fill="y", expand=True, padx=8, pady=8)
+        for cat in self.sorted_categories:
+            self.category_listbox.insert(END, cat)
+        if self.selected_category:
+            self.category_listbox.select_set(self.sorted_categories.index(self.selected_category))
+        self.category_listbox.bind("<<ListboxSelect>>", self.on_category_select)
+
+        # --- Правая часть: список твиков, предпросмотр, терминал ---
+        right_frame = ctk.CTkFrame(main_frame, width=900, height=700, corner_radius=18)
+        right_frame.pack(side="left", fill="both", expand=True, padx=18, pady=18)
+
+        # --- Терминал ---
+        self.terminal_panel = ctk.CTkFrame(right_frame, height=300, corner_radius=18)
+        self.terminal_panel.pack(side="bottom", fill="x", padx=0, pady=(16, 0))
+        ctk.CTkLabel(self.terminal_panel, text="Терминал", font=("Segoe UI", 15, "bold")).pack(pady=(8,2))
+        terminal_top = ctk.CTkFrame(self.terminal_panel, fg_color="transparent")
+        terminal_top.pack(fill="x", padx=4, pady=(0,2))
+        self.clear_terminal_btn = ctk.CTkButton(terminal_top, text="Очистить", width=80, height=28, font=("Segoe UI", 11), command=self.clear_terminal)
+        self.clear_terminal_btn.pack(side="right", padx=2)
+        self.full_output_btn = ctk.CTkButton(terminal_top, text="Весь вывод", width=100, height=28, font=("Segoe UI", 11), command=self.show_full_output)
+        self.full_output_btn.pack(side="right", padx=2)
+        self.cancel_run_btn = ctk.CTkButton(terminal_top, text="Отмена", width=80, height=28, font=("Segoe UI", 11), command=self.cancel_run, state="disabled")
+        self.cancel_run_btn.pack(side="right", padx=2)
+        self.progress_label = ctk.CTkLabel(terminal_top, text="", font=("Segoe UI", 11))
+        self.progress_label.pack(side="left", padx=(4, 6))
+        self.progress_bar = ctk.CTkProgressBar(terminal_top, width=260)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(side="left", padx=2)
+        self.terminal_box = ctk.CTkTextbox(self.terminal_panel, height=180, font=("Consolas", 12), wrap="none")
+        self.terminal_box.pack(fill="both", expand=True, padx=4, pady=4)
+        self.terminal_box.configure(state="disabled")
+        self.terminal_box.bind("<Control-c>", lambda e: self.terminal_box.event_generate('<<Copy>>'))
+        self.terminal = TerminalSink(self.terminal_box, RUNS_DIR)
+
+        # --- Предпросмотр ---
+        self.preview_box = ctk.CTkTextbox(right_frame, height=120, font=("Consolas", 12), wrap="none", corner_radius=12)
+        self.preview_box.pack(side="bottom", fill="x", padx=0, pady=(8, 0))
+        self.preview_box.configure(state="disabled")
+
+        # --- Список твиков ---
+        tweaks_frame = ctk.CTkFrame(right_frame, fg_color="transparent")
+        tweaks_frame.pack(side="top", fill="x", expand=False, padx=0, pady=(0, 0))
+        self.tweaks_tree = ttk.Treeview(tweaks_frame, columns=("type", "name", "folder", "p50", "p95", "fails", "status"), show="headings", selectmode="extended", height=8)
+        style = ttk.Style()
+        style.theme_use("default")
+        style.configure("Treeview",
+                        background="#232a36",
+                        foreground="#e0e0e0",
+                        fieldbackground="#232a36",
+                        rowheight=26,
+                        font=("Segoe UI", 13))
+        style.configure("Treeview.Heading",
+                        background="#232a36",
+                        foreground="#3b82f6",
+                        font=("Segoe UI", 13, "bold"))
+        style.map("Treeview",
+                  background=[('selected', '#3b82f6')],
+                  foreground=[('selected', '#fff')])
+        self.tweaks_tree.heading("type", text="Тип")
+        self.tweaks_tree.heading("name", text="Имя твика")
+        self.tweaks_tree.heading("folder", text="Папка")
+        self.tweaks_tree.heading("p50", text="Медиана")
+        self.tweaks_tree.heading("p95", text="p95")
+        self.tweaks_tree.heading("fails", text="Ошибки")
+        self.tweaks_tree.heading("status", text="Статус")
+        self.tweaks_tree.column("type", width=40, anchor="center")
+        self.tweaks_tree.column("name", width=300, anchor="w")
+        self.tweaks_tree.column("folder", width=150, anchor="w")
+        self.tweaks_tree.column("p50", width=75, anchor="e")
+        self.tweaks_tree.column("p95", width=75, anchor="e")
+        self.tweaks_tree.column("fails", width=70, anchor="e")
+        self.tweaks_tree.column("status", width=90, anchor="center")
+        self.tweaks_tree.pack(fill="both", expand=True, padx=0, pady=(0, 0))
+        self.tweaks_tree.bind("<<TreeviewSelect>>", self.on_tweak_select)
+        for tag in set(EXT_COLORS.values()) | {DEFAULT_EXT_COLOR}:
+            self.tweaks_tree.tag_configure(tag, foreground=tag)
+
+        # --- Кнопки действий ---
+        btns_frame = ctk.CTkFrame(right_frame, fg_color="transparent")
+        btns_frame.pack(side="top", fill="x", pady=(0, 8))
+        self.open_btn = ctk.CTkButton(btns_frame, text="Открыть в редакторе", command=self.open_in_editor, width=170)
+        self.open_btn.pack(side="left", padx=4)
+        self.copy_path_btn = ctk.CTkButton(btns_frame, text="Скопировать путь", command=self.copy_path, width=140)
+        self.copy_path_btn.pack(side="left", padx=4)
+        self.open_folder_btn = ctk.CTkButton(btns_frame, text="Открыть папку", command=self.open_folder, width=120)
+        self.open_folder_btn.pack(side="left", padx=4)
+        self.run_btn = ctk.CTkButton(btns_frame, text="\u2705  ПРИМЕНИТЬ ВЫБРАННЫЕ ТВИКИ", command=self.run_selected_tweaks, font=("Segoe UI", 16, "bold"), height=44, corner_radius=14, fg_color="#3b82f6", hover_color="#2563eb", text_color="#fff")
+        self.run_btn.pack(side="right", padx=4)
+        self.force_var = ctk.BooleanVar(value=False)
+        self.force_check = ctk.CTkCheckBox(btns_frame, text="Принудительно", variable=self.force_var, font=("Segoe UI", 12))
+        self.force_check.pack(side="right", padx=8)
+        self.coalesce_var = ctk.BooleanVar(value=self.settings.get("coalesce", False))
+        self.coalesce_check = ctk.CTkCheckBox(btns_frame, text="Один процесс", variable=self.coalesce_var,
+                                              font=("Segoe UI", 12), command=self.change_coalesce)
+        self.coalesce_check.pack(side="right", padx=8)
+
+        # --- О программе ---
+        self.about_btn = ctk.CTkButton(self, text="О программе", command=self.show_about, width=120)
+        self.about_btn.place(relx=0.01, rely=0.01, anchor="nw")
+        self.fleet_btn = ctk.CTkButton(self, text="Флот", command=self.show_fleet, width=80)
+        self.fleet_btn.place(relx=0.12, rely=0.01, anchor="nw")
+        self.profile_btn = ctk.CTkButton(self, text="Профиль", command=self.show_profile, width=80)
+        self.profile_btn.place(relx=0.19, rely=0.01, anchor="nw")
+
+        # --- Поиск и сортировка ---
+        filter_frame = ctk.CTkFrame(right_frame, fg_color="transparent")
+        filter_frame.pack(fill="x", pady=(0, 8))
+        ctk.CTkLabel(filter_frame, text="Поиск:", font=("Segoe UI", 12)).pack(side="left", padx=(0, 5))
+        self.search_entry = ctk.CTkEntry(filter_frame, textvariable=self.search_var, placeholder_text="Поиск твика...", width=220, font=("Segoe UI", 13), corner_radius=10)
+        self.search_entry.pack(side="left")
+        self.search_entry.bind("<KeyRelease>", self.on_search_changed)
+        ctk.CTkLabel(filter_frame, text="Сортировка:", font=("Segoe UI", 12)).pack(side="left", padx=(16, 5))
+        self.sort_menu = ctk.CTkOptionMenu(filter_frame, variable=self.sort_var, values=["По имени", "По дате", "По размеру", "По времени выполнения"], width=190, command=lambda _: self.update_tweaks_list())
+        self.sort_menu.pack(side="left")
+        ctk.CTkLabel(filter_frame, text="Потоки:", font=("Segoe UI", 12)).pack(side="left", padx=(16, 5))
+        self.workers_var = ctk.StringVar(value=str(self.settings.get("max_workers", DEFAULT_WORKERS)))
+        self.workers_menu = ctk.CTkOptionMenu(filter_frame, variable=self.workers_var, values=["1", "2", "4", "8", "16"], width=70, command=self.change_workers)
+        self.workers_menu.pack(side="left")
+
+        # --- Только теперь обновляем список твиков ---
+        self.update_tweaks_list()
+
+    @profiled("update_tweaks_list")
+    def update_tweaks_list(self, search_hits=None):
+        cat = self.get_selected_category()
+        search = self.search_var.get().lower().strip()
+        sort_type = self.sort_var.get()
+        if search and search_hits is None:
+            # Поиск идёт в фоне; список обновится, когда придут результаты
+            self._start_query(search)
+            return
+        if search:
+            # не больше MAX_HITS совпадений - их и сортируем
+            tweaks = sort_tweaks(search_hits, sort_type, self.stats)
+        else:
+            self._cancel_query()
+            tweaks = self.get_sorted_category(cat, sort_type)
+        self._tree_rows = sync_tree_rows(self.tweaks_tree, self._tree_rows, tweaks, self._make_row)
+        self._schedule_status(tweaks)
+
+    def _start_query(self, search):
+        # Запрос выполняется в потоке (проверка кандидатов читает файлы), результат забирает _poll_query;
+        # пока индекс строится - только по имени и папке
+        self._cancel_query()
+        gen = self._query_gen
+        stop = self._query_stop = threading.Event()
+        index = self.search_index
+        snapshot = None if index.ready else self.catalog.snapshot()
+
+        def worker():
+            try:
+                with self.profiler.span("search.query", "catalog"):
+                    if snapshot is None:
+                        hits = index.query(search, MAX_HITS, stop)
+                    else:
+                        hits = [tw for tws in snapshot.values() for tw in tws
+                                if search in tw.name.lower() or search in tw.folder.lower()][:MAX_HITS]
+            except Exception:
+                hits = []  # иначе _poll_query ждал бы ответа бесконечно
+            if hits is not None:
+                self._query_results.put((gen, hits))
+
+        threading.Thread(target=worker, name="search-query", daemon=True).start()
+        self._query_after = self.after(SEARCH_POLL_MS, self._poll_query)
+
+    def _cancel_query(self):
+        self._query_stop.set()
+        self._query_gen += 1
+        if self._query_after is not None:
+            self.after_cancel(self._query_after)
+            self._query_after = None
+
+    def _poll_query(self):
+        self._query_after = None
+        hits = None
+        while True:
+            try:
+                gen, result = self._query_results.get_nowait()
+            except queue.Empty:
+                break
+            if gen == self._query_gen:
+                hits = result
+        if hits is None:
+            self._query_after = self.after(SEARCH_POLL_MS, self._poll_query)
+        else:
+            self.update_tweaks_list(hits)
+
+    def get_sorted_category(self, cat, sort_type):
+        # Порядок сортировки кэшируется, пока список категории не заменён каталогом
+        source = self.catalog.folder(cat)
+        cached = self._sort_cache.get((cat, sort_type))
+        if cached is not None and cached[0] is source:
+            return cached[1]
+        result = sort_tweaks(source, sort_type, self.stats)
+        self._sort_cache[(cat, sort_type)] = (source, result)
+        return result
+
+    def _make_row(self, tw):
+        return self._row_values(tw), (EXT_COLORS.get(tw.ext, DEFAULT_EXT_COLOR),)
+
+    def _row_values(self, tw):
+        status = APPLY_STATUS.get(self.manifest.status(tw), "")
+        st = self.stats.get(tw.path)
+        if st is None:
+            return ("●", tw.name, tw.folder, "", "", "", status)
+        return ("●", tw.name, tw.folder, f"{st.p50:.2f} с", f"{st.p95:.2f} с", f"{st.failure_rate:.0%}", status)
+
+    def _update_rows(self, paths):
+        visible = set(self._tree_rows)
+        for path in paths:
+            tw = self.catalog.get(path)
+            if tw is not None and path in visible:
+                self.tweaks_tree.item(path, values=self._row_values(tw))
+
+    def _schedule_status(self, tweaks):
+        # Хэши для колонки "Статус" считаются в фоне только для ещё не хэшированных строк
+        missing = [tw for tw in tweaks
+                   if tw.path not in self._status_pending and self.manifest.cached_hash(tw) is None]
+        if not missing:
+            return
+        self._status_pending.update(tw.path for tw in missing)
+        self._status_jobs += 1
+
+        def worker():
+            try:
+                self.manifest.hash_many(missing)
+                # иначе хэши живут до конца следующего пакета и при новом запуске считаются заново
+                self.manifest.save()
+            finally:
+                self._catalog_queue.put(("status", [tw.path for tw in missing], None))
+
+        threading.Thread(target=worker, name="apply-status", daemon=True).start()
+        self._kick_catalog_poll()
+
+    def apply_stats(self, stats):
+        # Обновляем статистику и только те видимые строки, которых она коснулась
+        self.stats.update(stats)
+        for key in [k for k in self._sort_cache if k[1] == "По времени выполнения"]:
+            del self._sort_cache[key]
+        self._update_rows(stats)
+        if self.sort_var.get() == "По времени выполнения":
+            self.update_tweaks_list()
+
+    def on_search_changed(self, event=None):
+        # Небольшая задержка, чтобы не перестраивать список на каждое нажатие
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_after = None
+        self.update_tweaks_list()
+
+    def get_selected_category(self):
+        idxs = self.category_listbox.curselection()
+        if not idxs:
+            return self.sorted_categories[0] if self.sorted_categories else None
+        return self.category_listbox.get(idxs[0])
+
+    def on_category_select(self, event=None):
+        self.selected_category = self.get_selected_category()
+        self.update_tweaks_list()
+
+    def get_selected_tweak(self):
+        # iid строки - путь к твику
+        selected = self.tweaks_tree.selection()
+        return self.catalog.get(selected[0]) if selected else None
+
+    def on_tweak_select(self, event=None):
+        selected = self.tweaks_tree.selection()
+        if not selected:
+            return
+        tw = self.catalog.get(selected[0])
+        if tw:
+            self.show_preview(tw)
+            self._prefetch_neighbours(selected[0])
+
+    def show_preview(self, tw):
+        text = get_tweak_info(tw) if tw.ext in BINARY_EXTS else self.preview.get(tw)
+        self.preview_box.configure(state="normal")
+        self.preview_box.delete("1.0", "end")
+        self.preview_box.insert("end", text)
+        self.preview_box.configure(state="disabled")
+
+    def _prefetch_neighbours(self, iid):
+        paths = []
+        prev_iid = next_iid = iid
+        for _ in range(PREFETCH_ROWS):
+            next_iid = next_iid and self.tweaks_tree.next(next_iid)
+            prev_iid = prev_iid and self.tweaks_tree.prev(prev_iid)
+            paths.extend(p for p in (next_iid, prev_iid) if p)
+        self.preview.prefetch(self.catalog.resolve(paths))
+
+    def open_in_editor(self):
+        tw = self.get_selected_tweak()
+        if tw:
+            # Открываем в notepad
+            subprocess.Popen(["notepad", tw.path])
+
+    def copy_path(self):
+        tw = self.get_selected_tweak()
+        if tw:
+            self.clipboard_clear()
+            self.clipboard_append(tw.path)
+            self.print_terminal(f"Путь скопирован: {tw.path}")
+
+    def open_folder(self):
+        tw = self.get_selected_tweak()
+        if tw:
+            folder = os.path.dirname(tw.path)
+            subprocess.Popen(["explorer", folder])
+
+    def run_selected_tweaks(self):
+        if self.runner is not None and self.runner.is_running():
+            return
+        batch = self.catalog.resolve(self.tweaks_tree.selection())
+        if not batch:
+            messagebox.showwarning("Нет твиков", "Выберите хотя бы один твик для запуска.")
+            return
+        self.clear_terminal()
+        self.terminal.begin_run()
+        self._run_errors = []
+        self.runner = BatchRunner(batch, self._run_events, max_workers=int(self.workers_var.get()),
+                                  tweaks_dir=TWEAKS_DIR, default_timeout=self.settings.get("tweak_timeout"),
+                                  recorders=[get_run_logger(), get_history()],
+                                  manifest=self.manifest, force=self.force_var.get(),
+                                  coalesce=self.coalesce_var.get(), spool_dir=RUNS_DIR)
+        self.run_btn.configure(state="disabled")
+        self.cancel_run_btn.configure(state="normal")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text=f"0 / {len(batch)}")
+        self.runner.start()
+        self.after(30, self._poll_run_events)
+
+    def cancel_run(self):
+        if self.runner is not None:
+            self.runner.cancel()
+            self.cancel_run_btn.configure(state="disabled")
+            self.print_terminal("[CANCEL] Остановка...")
+
+    @profiled("poll_run_events")
+    def _poll_run_events(self):
+        # За один тик обрабатываем ограниченное число событий, чтобы окно оставалось отзывчивым
+        finished = False
+        for _ in range(2000):
+            try:
+                kind, tw, data = self._run_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "start":
+                self.print_terminal(f"$ {tw.path}")
+            elif kind == "line":
+                if self.runner.max_workers > 1:
+                    self.print_terminal(f"[{tw.name}] {data[1]}")
+                else:
+                    self.print_terminal(data[1])
+            elif kind == "skipped":
+                self.print_terminal(f"[SKIP] {tw.name} {data}, пропущен")
+            elif kind == "timeout":
+                self.print_terminal(f"[TIMEOUT] {tw.name} превысил лимит {data} с, процесс остановлен")
+            elif kind == "exit":
+                if data == 0:
+                    self.print_terminal(f"[OK] {tw.name} завершён успешно")
+                else:
+                    self.print_terminal(f"[ERR] {tw.name} завершён с ошибкой {data}")
+            elif kind == "error":
+                self.print_terminal(f"[EXCEPTION] {tw.name}: {data}")
+                self._run_errors.append(f"{tw.name}: {data}")
+            elif kind == "progress":
+                done, total = data
+                self.progress_bar.set(done / total if total else 1)
+                self.progress_label.configure(text=f"{done} / {total}")
+            elif kind == "batch_done":
+                finished = True
+                if data:
+                    self.print_terminal("[CANCEL] Запуск отменён")
+                break
+        if not finished:
+            self.after(30, self._poll_run_events)
+            return
+        self.run_btn.configure(state="normal")
+        self.cancel_run_btn.configure(state="disabled")
+        self.terminal.end_run()
+        self.apply_stats(get_history().stats(tw.path for tw in self.runner.tweaks))
+        if self._run_errors:
+            messagebox.showerror("Ошибки при запуске", "\n".join(self._run_errors))
+
+    def print_terminal(self, text, tag=None):
+        self.terminal.write(text)
+
+    def clear_terminal(self):
+        self.terminal.clear()
+
+    def show_full_output(self):
+        path = self.terminal.sync()
+        if not path or not os.path.exists(path):
+            messagebox.showinfo("Весь вывод", "Полный вывод появится после запуска твиков.")
+            return
+        subprocess.Popen(["notepad", path])
+
+    def show_about(self):
+        win = ctk.CTkToplevel(self)
+        win.title("О программе")
+        win.geometry("500x320")
+        ctk.CTkLabel(win, text="Windows Tweaks Optimizer", font=("Segoe UI", 18, "bold"), text_color="#3b82f6").pack(pady=(18, 8))
+        ctk.CTkLabel(win, text="UI Created by Faliseven\nTweaks Created by scode18", font=("Segoe UI", 13)).pack(pady=4)
+        ctk.CTkLabel(win, text="GitHub: https://github.com/faliseven\nТвики: https://github.com/scode18", font=("Segoe UI", 12)).pack(pady=4)
+        ctk.CTkButton(win, text="Открыть GitHub Faliseven", command=lambda: webbrowser.open("https://github.com/faliseven")).pack(pady=8)
+        ctk.CTkButton(win, text="Открыть GitHub scode18", command=lambda: webbrowser.open("https://github.com/scode18")).pack(pady=4)
+        ctk.CTkLabel(win, text="2025", font=("Segoe UI", 11, "italic"), text_color="#888").pack(side="bottom", pady=8)
+
+    def show_fleet(self):
+        if self.fleet_window is not None and self.fleet_window.winfo_exists():
+            self.fleet_window.focus()
+            return
+        self.fleet_window = FleetWindow(self)
+
+    def show_profile(self):
+        if self.profile_window is not None and self.profile_window.winfo_exists():
+            self.profile_window.focus()
+            return
+        self.profile_window = ProfileWindow(self)
+
+    def change_profiling(self, enabled):
+        self.profiler.enable(enabled)
+        if enabled:
+            self.lag_monitor.start()
+        else:
+            self.lag_monitor.stop()
+        self.settings["profiling"] = bool(enabled)
+        save_settings(self.settings)
+
+    def load_user_settings(self):
+        if self.settings.get("theme"):
+            ctk.set_appearance_mode(self.settings["theme"])
+        if self.settings.get("geometry"):
+            self.geometry(self.settings["geometry"])
+
+    def change_workers(self, value):
+        self.settings["max_workers"] = int(value)
+        save_settings(self.settings)
+
+    def change_coalesce(self):
+        self.settings["coalesce"] = bool(self.coalesce_var.get())
+        save_settings(self.settings)
+
+    def change_theme(self, mode):
+        ctk.set_appearance_mode(mode)
+        self.settings["theme"] = mode
+        save_settings(self.settings)
+
+    def destroy(self):
+        self._catalog_scan[1].set()
+        if self.watcher is not None:
+            self.watcher.stop()
+        self._search_stop.set()
+        self._cancel_query()
+        if self.fleet_window is not None:
+            self.fleet_window.destroy()
+        if self.profile_window is not None:
+            self.profile_window.destroy()
+        self.lag_monitor.stop()
+        if self.runner is not None:
+            self.runner.cancel()
+        self.terminal.end_run()
+        self.settings["geometry"] = self.geometry()
+        save_settings(self.settings)
+        super().destroy()
+
+def main():
+    if not os.path.isdir(TWEAKS_DIR):
+        ctk.CTk().withdraw()  # скрыть пустое окно
+        messagebox.showerror("Ошибка", "Отсутствует папка с твиками!\nПопробуйте скачать или переустановить программу.")
+        return 1
+    app = TweakOptimizerApp()
+    app.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main()) 
@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+
+# --- История запусков ---
+# Каждый запуск твика сохраняется в SQLite; по истории считаются медиана и 95-й перцентиль
+# времени выполнения и доля ошибок.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tweak TEXT NOT NULL,
+    name TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    exit_code INTEGER,
+    timed_out INTEGER NOT NULL DEFAULT 0,
+    stdout_bytes INTEGER NOT NULL DEFAULT 0,
+    stderr_bytes INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_tweak ON runs (tweak, duration);
+"""
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class TweakStats:
+    __slots__ = ("runs", "failures", "p50", "p95", "last_code")
+
+    def __init__(self, runs, failures, p50, p95, last_code):
+        self.runs = runs
+        self.failures = failures
+        self.p50 = p50
+        self.p95 = p95
+        self.last_code = last_code
+
+    @property
+    def failure_rate(self):
+        return self.failures / self.runs if self.runs else 0.0
+
+
+class HistoryStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def record(self, tw, result):
+        # Вызывается движком из рабочих потоков
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (tweak, name, started, duration, exit_code, timed_out, stdout_bytes, stderr_bytes, error)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (tw.path, tw.name, result.started, result.duration, result.code, int(result.timed_out),
+                 result.stdout_bytes, result.stderr_bytes, result.error),
+            )
+            self._conn.commit()
+
+    def stats(self, paths=None):
+        # path -> TweakStats; paths ограничивает выборку нужными твиками
+        with self._lock:
+            if paths is None:
+                rows = self._conn.execute(
+                    "SELECT tweak, duration, exit_code, error FROM runs ORDER BY tweak, duration").fetchall()
+                last = self._conn.execute(
+                    "SELECT tweak, exit_code FROM runs WHERE id IN (SELECT MAX(id) FROM runs GROUP BY tweak)").fetchall()
+            else:
+                paths = list(paths)
+                rows = []
+                last = []
+                for i in range(0, len(paths), 500):
+                    chunk = paths[i:i + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows += self._conn.execute(
+                        f"SELECT tweak, duration, exit_code, error FROM runs WHERE tweak IN ({marks}) ORDER BY tweak, duration", chunk).fetchall()
+                    last += self._conn.execute(
+                        f"SELECT tweak, exit_code FROM runs WHERE id IN (SELECT MAX(id) FROM runs WHERE tweak IN ({marks}) GROUP BY tweak)", chunk).fetchall()
+        last_codes = dict(last)
+        result = {}
+        durations = []
+        failures = 0
+        current = None
+        for tweak, duration, code, error in rows + [(None, 0, 0, None)]:
+            if tweak != current:
+                if current is not None:
+                    result[current] = TweakStats(len(durations), failures, percentile(durations, 0.5),
+                                                 percentile(durations, 0.95), last_codes.get(current))
+                current = tweak
+                durations = []
+                failures = 0
+            durations.append(duration)
+            if code != 0 or error is not None:
+                failures += 1
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
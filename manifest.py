@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Манифест применённых твиков ---
+# Успешно применённые твики запоминаются по хэшу содержимого (sha256).
+# Хэши кэшируются по (путь, размер, mtime), поэтому неизменённые файлы повторно не читаются.
+# Свежие размер и mtime хранятся в самом манифесте - записи каталога (Tweak) не меняются.
+
+MANIFEST_VERSION = 1
+HASH_WORKERS = 4
+CHUNK = 1024 * 1024
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ApplyManifest:
+    def __init__(self, path, workers=HASH_WORKERS):
+        self.path = path
+        self.applied = {}  # хэш -> {"path", "at"}
+        self.hashes = {}  # путь -> [размер, mtime, хэш]
+        self.applied_paths = set()
+        # путь -> (размер, mtime записи каталога, размер, mtime по os.stat); stat верен, пока запись та же
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        with self._lock:
+            self.applied = data.get("applied", {})
+            self.hashes = data.get("hashes", {})
+            self.applied_paths = {entry.get("path") for entry in self.applied.values()}
+
+    def save(self):
+        # Вызывается и движком после пакета, и окном после фонового хэширования
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps({"version": MANIFEST_VERSION, "applied": self.applied, "hashes": self.hashes},
+                                  ensure_ascii=False)
+                self._dirty = False
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except Exception:
+                pass
+
+    def cached_hash(self, tw):
+        with self._lock:
+            stat = self.stats.get(tw.path)
+            entry = self.hashes.get(tw.path)
+        # запись каталога с другими размером/mtime новее нашего stat - файл правили после него
+        size, mtime = stat[2:] if stat is not None and stat[:2] == (tw.size, tw.mtime) else (tw.size, tw.mtime)
+        if entry is not None and entry[0] == size and entry[1] == mtime:
+            return entry[2]
+        return None
+
+    def hash_of(self, tw):
+        # Каталог не замечает правку файла без изменения папки, поэтому размер и mtime берём заново
+        try:
+            st = os.stat(tw.path)
+        except OSError:
+            return None
+        with self._lock:
+            self.stats[tw.path] = (tw.size, tw.mtime, st.st_size, st.st_mtime)
+        digest = self.cached_hash(tw)
+        if digest is not None:
+            return digest
+        try:
+            digest = file_hash(tw.path)
+        except OSError:
+            return None
+        with self._lock:
+            self.hashes[tw.path] = [st.st_size, st.st_mtime, digest]
+            self._dirty = True
+        return digest
+
+    def hash_many(self, tweaks):
+        # Хэши считаются в пуле потоков; возвращает {путь: хэш}
+        tweaks = list(tweaks)
+        return dict(zip((tw.path for tw in tweaks), self._pool.map(self.hash_of, tweaks)))
+
+    def is_applied(self, tw, digest=None):
+        digest = digest or self.cached_hash(tw)
+        with self._lock:
+            return digest is not None and digest in self.applied
+
+    def status(self, tw):
+        # "applied" - текущее содержимое уже успешно применялось, "changed" - применялась другая версия
+        digest = self.cached_hash(tw)
+        if digest is None:
+            return None
+        with self._lock:
+            if digest in self.applied:
+                return "applied"
+            if tw.path in self.applied_paths:
+                return "changed"
+        return None
+
+    def record(self, tw, result):
+        # Вызывается движком после завершения твика; запоминаем только успешные запуски
+        if result.code != 0 or result.error is not None:
+            return
+        digest = self.hash_of(tw)
+        if digest is None:
+            return
+        with self._lock:
+            self.applied[digest] = {"path": tw.path, "at": datetime.datetime.now().isoformat(timespec="seconds")}
+            self.applied_paths.add(tw.path)
+            self._dirty = True
@@ -1,383 +1,313 @@
-import os
-import subprocess
-import customtkinter as ctk
-from tkinter import messagebox, END, Listbox, SINGLE, MULTIPLE, ttk
-import json
-import datetime
-import webbrowser
-from PIL import Image
-
-# --- Настройки интерфейса ---
-ctk.set_appearance_mode("dark")
-ctk.set_default_color_theme("blue")
-
-TWEAKS_DIR = "tweaks"
-SETTINGS_FILE = "optimizer_settings.json"
-LOG_FILE = "optimizer_log.txt"
-ICON_PATH = None  # Можно добавить путь к иконке, если есть
-
-SUPPORTED_EXTS = (".bat", ".cmd", ".exe", ".vbs", ".ps1", ".reg", ".pow")
-
-if not os.path.isdir(TWEAKS_DIR):
-    ctk.CTk().withdraw()  # скрыть пустое окно
-    messagebox.showerror("Ошибка", "Отсутствует папка с твиками!\nПопробуйте скачать или переустановить программу.")
-    exit(1)
-
-# --- Вспомогательные функции ---
-def get_tweak_content(filepath, max_lines=500):
-    try:
-        with open(filepath, encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-            if len(lines) > max_lines:
-                return ''.join(lines[:max_lines]) + f"\n... (файл обрезан, всего строк: {len(lines)})"
-            return ''.join(lines)
-    except Exception as e:
-        return f"Ошибка чтения: {e}"
-
-def find_tweaks():
-    tweaks = {}
-    all_folders = set()
-    for root, dirs, files in os.walk(TWEAKS_DIR):
-        rel_root = os.path.relpath(root, TWEAKS_DIR)
-        rel_root = os.path.normpath(rel_root)
-        tws = []
-        for file in files:
-            if file.lower().endswith(SUPPORTED_EXTS):
-                path = os.path.join(root, file)
-                tws.append({
-                    "name": file,
-                    "path": path,
-                    "ext": os.path.splitext(file)[1].lower(),
-                    "folder": rel_root,
-                })
-        if tws:
-            tweaks[rel_root] = tws
-    return tweaks
-
-def save_settings(settings):
-    try:
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(settings, f)
-    except Exception:
-        pass
-
-def load_settings():
-    try:
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def log_action(action):
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {action}\n")
-    except Exception:
-        pass
-
-def get_tweak_info(tw):
-    try:
-        stat = os.stat(tw["path"])
-        size = stat.st_size
-        mtime = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-        return f"Имя: {tw['name']}\nПуть: {tw['path']}\nПапка: {tw['folder']}\nРазмер: {size} байт\nДата изменения: {mtime}\nРасширение: {tw['ext']}"
-    except Exception as e:
-        return f"Ошибка получения информации: {e}"
-
-# --- GUI ---
-class TweakOptimizerApp(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-        self.title("Windows Tweaks Optimizer")
-        if ICON_PATH and os.path.exists(ICON_PATH):
-            self.iconbitmap(ICON_PATH)
-        self.geometry("1200x800+379+107")
-        self.resizable(False, False)
-        self.settings = load_settings()
-        self.tweaks = find_tweaks()
-        self.sorted_categories = sorted(self.tweaks.keys())
-        self.selected_category = self.sorted_categories[0] if self.sorted_categories else None
-        # --- Переменные поиска и сортировки (создаём до update_tweaks_list) ---
-        self.search_var = ctk.StringVar()
-        self.sort_var = ctk.StringVar(value="По имени")
-        self._build_ui()
-        self.load_user_settings()
-
-    def _build_ui(self):
-        # --- Верхняя подпись ---
-        self.header = ctk.CTkLabel(self, text="UI Created by Faliseven  |  Tweaks Created by scode18", font=("Segoe UI", 13, "bold"), text_color="#3b82f6")
-        self.header.pack(side="top", pady=(10, 0))
-
-        # --- Переключатель темы ---
-        theme_frame = ctk.CTkFrame(self, fg_color="transparent")
-        theme_frame.place(relx=0.99, rely=0.01, anchor="ne")
-        ctk.CTkLabel(theme_frame, text="Тема:", font=("Segoe UI", 11)).pack(side="left", padx=(0, 2))
-        self.theme_var = ctk.StringVar(value=self.settings.get("theme", "dark"))
-        self.theme_switch = ctk.CTkOptionMenu(theme_frame, variable=self.theme_var, values=["dark", "light"], width=70, command=self.change_theme)
-        self.theme_switch.pack(side="left")
-
-        # --- Основной фрейм ---
-        main_frame = ctk.CTkFrame(self, width=1200, height=800)
-        main_frame.pack(fill="both", expand=True, padx=0, pady=(8,0))
-
-        # --- Список категорий слева ---
-        self.sidebar = ctk.CTkFrame(main_frame, width=260, height=700, corner_radius=18)
-        self.sidebar.pack(side="left", fill="y", padx=(18,0), pady=18)
-        ctk.CTkLabel(self.sidebar, text="Категории (папки)", font=("Segoe UI", 18, "bold")).pack(pady=(14,7))
-        self.category_listbox = Listbox(self.sidebar, selectmode=SINGLE, exportselection=False, width=28, height=32, font=("Segoe UI", 13), bg="#232a36", fg="#e0e0e0", highlightthickness=0, relief="flat", selectbackground="#3b82f6", selectforeground="#fff")
-        self.category_listbox.pack(fill="y", expand=True, padx=8, pady=8)
-        for cat in self.sorted_categories:
-            self.category_listbox.insert(END, cat)
-        if self.selected_category:
-            self.category_listbox.select_set(self.sorted_categories.index(self.selected_category))
-        self.category_listbox.bind("<<ListboxSelect>>", self.on_category_select)
-
-        # --- Правая часть: список твиков, предпросмотр, терминал ---
-        right_frame = ctk.CTkFrame(main_frame, width=900, height=700, corner_radius=18)
-        right_frame.pack(side="left", fill="both", expand=True, padx=18, pady=18)
-
-        # --- Терминал ---
-        self.terminal_panel = ctk.CTkFrame(right_frame, height=300, corner_radius=18)
-        self.terminal_panel.pack(side="bottom", fill="x", padx=0, pady=(16, 0))
-        ctk.CTkLabel(self.terminal_panel, text="Терминал", font=("Segoe UI", 15, "bold")).pack(pady=(8,2))
-        terminal_top = ctk.CTkFrame(self.terminal_panel, fg_color="transparent")
-        terminal_top.pack(fill="x", padx=4, pady=(0,2))
-        self.clear_terminal_btn = ctk.CTkButton(terminal_top, text="Очистить", width=80, height=28, font=("Segoe UI", 11), command=self.clear_terminal)
-        self.clear_terminal_btn.pack(side="right", padx=2)
-        self.terminal_box = ctk.CTkTextbox(self.terminal_panel, height=260, font=("Consolas", 12), wrap="none")
-        self.terminal_box.pack(fill="both", expand=True, padx=4, pady=4)
-        self.terminal_box.configure(state="disabled")
-        self.terminal_box.bind("<Control-c>", lambda e: self.terminal_box.event_generate('<<Copy>>'))
-
-        # --- Список твиков ---
-        tweaks_frame = ctk.CTkFrame(right_frame, fg_color="transparent")
-        tweaks_frame.pack(side="top", fill="x", expand=False, padx=0, pady=(0, 0))
-        self.tweaks_tree = ttk.Treeview(tweaks_frame, columns=("type", "name"), show="headings", selectmode="extended", height=10)
-        style = ttk.Style()
-        style.theme_use("default")
-        style.configure("Treeview",
-                        background="#232a36",
-                        foreground="#e0e0e0",
-                        fieldbackground="#232a36",
-                        rowheight=26,
-                        font=("Segoe UI", 13))
-        style.configure("Treeview.Heading",
-                        background="#232a36",
-                        foreground="#3b82f6",
-                        font=("Segoe UI", 13, "bold"))
-        style.map("Treeview",
-                  background=[('selected', '#3b82f6')],
-                  foreground=[('selected', '#fff')])
-        self.tweaks_tree.heading("type", text="Тип")
-        self.tweaks_tree.heading("name", text="Имя твика")
-        self.tweaks_tree.column("type", width=40, anchor="center")
-        self.tweaks_tree.column("name", width=600, anchor="w")
-        self.tweaks_tree.pack(fill="both", expand=True, padx=0, pady=(0, 0))
-        self.tweaks_tree.bind("<<TreeviewSelect>>", self.on_tweak_select)
-
-        # --- Кнопки действий ---
-        btns_frame = ctk.CTkFrame(right_frame, fg_color="transparent")
-        btns_frame.pack(side="top", fill="x", pady=(0, 8))
-        self.open_btn = ctk.CTkButton(btns_frame, text="Открыть в редакторе", command=self.open_in_editor, width=170)
-        self.open_btn.pack(side="left", padx=4)
-        self.copy_path_btn = ctk.CTkButton(btns_frame, text="Скопировать путь", command=self.copy_path, width=140)
-        self.copy_path_btn.pack(side="left", padx=4)
-        self.open_folder_btn = ctk.CTkButton(btns_frame, text="Открыть папку", command=self.open_folder, width=120)
-        self.open_folder_btn.pack(side="left", padx=4)
-        self.run_btn = ctk.CTkButton(btns_frame, text="\u2705  ПРИМЕНИТЬ ВЫБРАННЫЕ ТВИКИ", command=self.run_selected_tweaks, font=("Segoe UI", 16, "bold"), height=44, corner_radius=14, fg_color="#3b82f6", hover_color="#2563eb", text_color="#fff")
-        self.run_btn.pack(side="right", padx=4)
-
-        # --- О программе ---
-        self.about_btn = ctk.CTkButton(self, text="О программе", command=self.show_about, width=120)
-        self.about_btn.place(relx=0.01, rely=0.01, anchor="nw")
-
-        # --- Поиск и сортировка ---
-        filter_frame = ctk.CTkFrame(right_frame, fg_color="transparent")
-        filter_frame.pack(fill="x", pady=(0, 8))
-        ctk.CTkLabel(filter_frame, text="Поиск:", font=("Segoe UI", 12)).pack(side="left", padx=(0, 5))
-        self.search_entry = ctk.CTkEntry(filter_frame, textvariable=self.search_var, placeholder_text="Поиск твика...", width=220, font=("Segoe UI", 13), corner_radius=10)
-        self.search_entry.pack(side="left")
-        self.search_entry.bind("<KeyRelease>", lambda e: self.update_tweaks_list())
-        ctk.CTkLabel(filter_frame, text="Сортировка:", font=("Segoe UI", 12)).pack(side="left", padx=(16, 5))
-        self.sort_menu = ctk.CTkOptionMenu(filter_frame, variable=self.sort_var, values=["По имени", "По дате", "По размеру"], width=140, command=lambda _: self.update_tweaks_list())
-        self.sort_menu.pack(side="left")
-
-        # --- Только теперь обновляем список твиков ---
-        self.update_tweaks_list()
-
-    def update_tweaks_list(self):
-        self.tweaks_tree.delete(*self.tweaks_tree.get_children())
-        cat = self.get_selected_category()
-        tweaks = self.tweaks.get(cat, [])
-        search = self.search_var.get().lower()
-        if search:
-            tweaks = [tw for tw in tweaks if search in tw["name"].lower() or search in tw["folder"].lower()]
-        sort_type = self.sort_var.get()
-        if sort_type == "По имени":
-            tweaks = sorted(tweaks, key=lambda x: x["name"].lower())
-        elif sort_type == "По дате":
-            tweaks = sorted(tweaks, key=lambda x: os.path.getmtime(x["path"]) if os.path.exists(x["path"]) else 0, reverse=True)
-        elif sort_type == "По размеру":
-            tweaks = sorted(tweaks, key=lambda x: os.path.getsize(x["path"]) if os.path.exists(x["path"]) else 0, reverse=True)
-        for tw in tweaks:
-            ext = tw["ext"]
-            if ext == ".exe":
-                color = "#22c55e"  # зелёный
-            elif ext in (".bat", ".cmd"):
-                color = "#3b82f6"  # синий
-            elif ext == ".vbs":
-                color = "#a21caf"  # фиолетовый
-            elif ext == ".ps1":
-                color = "#f59e42"  # оранжевый
-            elif ext == ".reg":
-                color = "#a16207"  # коричневый
-            elif ext == ".pow":
-                color = "#eab308"  # жёлтый
-            else:
-                color = "#64748b"  # серый
-            circle = "●"
-            self.tweaks_tree.insert("", "end", iid=tw["path"], values=(circle, tw["name"]), tags=(color,))
-        for tag in ["#22c55e", "#3b82f6", "#a21caf", "#f59e42", "#a16207", "#eab308", "#64748b"]:
-            self.tweaks_tree.tag_configure(tag, foreground=tag)
-
-    def get_selected_category(self):
-        idxs = self.category_listbox.curselection()
-        if not idxs:
-            return self.sorted_categories[0]
-        return self.category_listbox.get(idxs[0])
-
-    def on_category_select(self, event=None):
-        self.update_tweaks_list()
-
-    def on_tweak_select(self, event=None):
-        selected = self.tweaks_tree.selection()
-        if not selected:
-            return
-        path = selected[0]
-        tw = None
-        for tweaks in self.tweaks.values():
-            tw = next((t for t in tweaks if t["path"] == path), None)
-            if tw:
-                break
-        if tw:
-            pass
-
-    def open_in_editor(self):
-        selected = self.tweaks_tree.selection()
-        cat = self.get_selected_category()
-        tweaks = self.tweaks.get(cat, [])
-        if not selected:
-            return
-        idx = self.tweaks_tree.index(selected[0])
-        if idx < len(tweaks):
-            # Открываем в notepad
-            subprocess.Popen(["notepad", tweaks[idx]["path"]])
-
-    def copy_path(self):
-        selected = self.tweaks_tree.selection()
-        cat = self.get_selected_category()
-        tweaks = self.tweaks.get(cat, [])
-        if not selected:
-            return
-        idx = self.tweaks_tree.index(selected[0])
-        if idx < len(tweaks):
-            self.clipboard_clear()
-            self.clipboard_append(tweaks[idx]["path"])
-            self.print_terminal(f"Путь скопирован: {tweaks[idx]['path']}")
-
-    def open_folder(self):
-        selected = self.tweaks_tree.selection()
-        cat = self.get_selected_category()
-        tweaks = self.tweaks.get(cat, [])
-        if not selected:
-            return
-        idx = self.tweaks_tree.index(selected[0])
-        if idx < len(tweaks):
-            folder = os.path.dirname(tweaks[idx]["path"])
-            subprocess.Popen(["explorer", folder])
-
-    def run_selected_tweaks(self):
-        selected = self.tweaks_tree.selection()
-        cat = self.get_selected_category()
-        tweaks = self.tweaks.get(cat, [])
-        if not selected:
-            messagebox.showwarning("Нет твиков", "Выберите хотя бы один твик для запуска.")
-            return
-        self.clear_terminal()
-        errors = []
-        for sel in selected:
-            idx = self.tweaks_tree.index(sel)
-            if idx < len(tweaks):
-                tw = tweaks[idx]
-                self.print_terminal(f"$ {tw['path']}")
-                log_action(f"RUN: {tw['path']}")
-                try:
-                    proc = subprocess.Popen(tw['path'], shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    while True:
-                        out = proc.stdout.readline()
-                        if out:
-                            try:
-                                out_decoded = out.decode('utf-8').rstrip()
-                            except UnicodeDecodeError:
-                                out_decoded = out.decode('cp866', errors='replace').rstrip()
-                            self.print_terminal(out_decoded)
-                        err = proc.stderr.readline()
-                        if err:
-                            try:
-                                err_decoded = err.decode('utf-8').rstrip()
-                            except UnicodeDecodeError:
-                                err_decoded = err.decode('cp866', errors='replace').rstrip()
-                            self.print_terminal(err_decoded)
-                        if out == b'' and err == b'' and proc.poll() is not None:
-                            break
-                    code = proc.poll()
-                    if code == 0:
-                        self.print_terminal(f"[OK] {tw['name']} завершён успешно")
-                    else:
-                        self.print_terminal(f"[ERR] {tw['name']} завершён с ошибкой {code}")
-                except Exception as e:
-                    self.print_terminal(f"[EXCEPTION] {tw['name']}: {e}")
-        if errors:
-            messagebox.showerror("Ошибки при запуске", "\n".join(errors))
-
-    def print_terminal(self, text, tag=None):
-        self.terminal_box.configure(state="normal")
-        self.terminal_box.insert("end", text+"\n")
-        self.terminal_box.see("end")
-        self.terminal_box.configure(state="disabled")
-
-    def clear_terminal(self):
-        self.terminal_box.configure(state="normal")
-        self.terminal_box.delete("1.0", "end")
-        self.terminal_box.configure(state="disabled")
-
-    def show_about(self):
-        win = ctk.CTkToplevel(self)
-        win.title("О программе")
-        win.geometry("500x320")
-        ctk.CTkLabel(win, text="Windows Tweaks Optimizer", font=("Segoe UI", 18, "bold"), text_color="#3b82f6").pack(pady=(18, 8))
-        ctk.CTkLabel(win, text="UI Created by Faliseven\nTweaks Created by scode18", font=("Segoe UI", 13)).pack(pady=4)
-        ctk.CTkLabel(win, text="GitHub: https://github.com/faliseven\nТвики: https://github.com/scode18", font=("Segoe UI", 12)).pack(pady=4)
-        ctk.CTkButton(win, text="Открыть GitHub Faliseven", command=lambda: webbrowser.open("https://github.com/faliseven")).pack(pady=8)
-        ctk.CTkButton(win, text="Открыть GitHub scode18", command=lambda: webbrowser.open("https://github.com/scode18")).pack(pady=4)
-        ctk.CTkLabel(win, text="2025", font=("Segoe UI", 11, "italic"), text_color="#888").pack(side="bottom", pady=8)
-
-    def load_user_settings(self):
-        if self.settings.get("theme"):
-            ctk.set_appearance_mode(self.settings["theme"])
-        if self.settings.get("geometry"):
-            self.geometry(self.settings["geometry"])
-
-    def change_theme(self, mode):
-        ctk.set_appearance_mode(mode)
-        self.settings["theme"] = mode
-        save_settings(self.settings)
-
-    def destroy(self):
-        self.settings["geometry"] = self.geometry()
-        save_settings(self.settings)
-        super().destroy()
-
-if __name__ == "__main__":
-    app = TweakOptimizerApp()
-    app.mainloop() 
+import os
+import sys
+import json
+import time
+import argparse
+
+# --- Точка входа ---
+# Без аргументов запускается окно; GUI-модули (customtkinter, PIL) импортируются только тогда.
+#   python -m optimizer list [--category X] [--json]
+#   python -m optimizer run --category X [--tweak имя.bat] [--parallel 8] [--timeout 120] [--force] [--coalesce] [--json]
+#   python -m optimizer log [--tweak имя.bat] [--failed] [--since 2025-01-01]
+#   python -m optimizer stats [--json]
+#   python -m optimizer agent [--bind 0.0.0.0] [--port 47800] [--token T]
+#   python -m optimizer fleet --hosts pc1,pc2:47801 [--hosts-file hosts.txt] [--preset preset.json] [--category X] [--fanout 16] [--json]
+
+
+def _emit_json(obj):
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def cmd_list(args):
+    from core import load_catalog
+    catalog = load_catalog()
+    if args.category:
+        tweaks = sorted((tw for cat in args.category for tw in catalog.folder(os.path.normpath(cat))), key=lambda tw: tw.name.lower())
+        for tw in tweaks:
+            if args.json:
+                _emit_json({"name": tw.name, "path": tw.path, "folder": tw.folder, "ext": tw.ext, "size": tw.size, "mtime": tw.mtime})
+            else:
+                print(tw.path)
+        return 0
+    for cat in sorted(catalog.folders()):
+        if args.json:
+            _emit_json({"category": cat, "tweaks": len(catalog.folder(cat))})
+        else:
+            print(f"{cat}\t{len(catalog.folder(cat))}")
+    return 0
+
+
+def cmd_run(args):
+    import socket
+    from core import load_catalog, select_tweaks, run_batch
+    catalog = load_catalog()
+    tweaks = select_tweaks(catalog, args.category or (), args.tweak or ())
+    if not tweaks:
+        print("Не найдено ни одного твика для запуска.", file=sys.stderr)
+        return 2
+    host = socket.gethostname()
+    started = {}
+    results = []
+    prefix = args.parallel > 1
+
+    def on_event(kind, tw, data):
+        if kind == "start":
+            started[tw.path] = time.monotonic()
+            if args.json:
+                _emit_json({"event": "start", "tweak": tw.path})
+            else:
+                print(f"$ {tw.path}", flush=True)
+        elif kind == "line":
+            stream, text = data
+            if args.json:
+                _emit_json({"event": "line", "tweak": tw.path, "stream": stream, "text": text})
+            else:
+                print(f"[{tw.name}] {text}" if prefix else text, flush=True)
+        elif kind == "timeout":
+            if args.json:
+                _emit_json({"event": "timeout", "tweak": tw.path, "timeout": data})
+            else:
+                print(f"[TIMEOUT] {tw.name} превысил лимит {data} с, процесс остановлен", flush=True)
+        elif kind == "skipped":
+            results.append({"tweak": tw.path, "code": 0, "duration": 0.0, "error": None, "skipped": True})
+            if args.json:
+                _emit_json(dict(results[-1], event=kind))
+            else:
+                print(f"[SKIP] {tw.name} {data}, пропущен", flush=True)
+        elif kind in ("exit", "error"):
+            duration = time.monotonic() - started.get(tw.path, time.monotonic())
+            code = data if kind == "exit" else None
+            results.append({"tweak": tw.path, "code": code, "duration": round(duration, 3),
+                            "error": data if kind == "error" else None})
+            if args.json:
+                _emit_json(dict(results[-1], event=kind))
+            elif kind == "error":
+                print(f"[EXCEPTION] {tw.name}: {data}", flush=True)
+            elif code == 0:
+                print(f"[OK] {tw.name} завершён успешно", flush=True)
+            else:
+                print(f"[ERR] {tw.name} завершён с ошибкой {code}", flush=True)
+
+    batch_started = time.monotonic()
+    try:
+        cancelled = run_batch(tweaks, on_event, max_workers=args.parallel, default_timeout=args.timeout, force=args.force,
+                              coalesce=args.coalesce)
+    except KeyboardInterrupt:
+        cancelled = True
+    failed = [r for r in results if r["code"] != 0]
+    summary = {"event": "summary", "host": host, "total": len(tweaks), "ok": len(results) - len(failed),
+               "failed": len(failed), "skipped": sum(1 for r in results if r.get("skipped")), "cancelled": cancelled, "duration": round(time.monotonic() - batch_started, 3)}
+    if args.json:
+        _emit_json(summary)
+    else:
+        print(f"Готово: {summary['ok']} из {summary['total']} успешно (пропущено: {summary['skipped']}), ошибок: {summary['failed']}, "
+              f"время: {summary['duration']} с" + (" (отменено)" if cancelled else ""))
+    if cancelled:
+        return 130
+    return 1 if failed else 0
+
+
+def cmd_log(args):
+    from core import LOG_FILE
+    from runlog import query
+    for rec in query(LOG_FILE, tweak=args.tweak, event="run", host=args.host, since=args.since, failed=True if args.failed else None):
+        if args.json:
+            _emit_json(rec)
+        else:
+            print(f"{rec.get('start')}  {rec.get('exit_code')!s:>5}  {rec.get('duration', 0):9.3f} с  {rec.get('tweak')}")
+    return 0
+
+
+def cmd_stats(args):
+    from core import get_history
+    stats = get_history().stats()
+    for path in sorted(stats, key=lambda p: stats[p].p50, reverse=True):
+        st = stats[path]
+        if args.json:
+            _emit_json({"tweak": path, "runs": st.runs, "failures": st.failures, "failure_rate": round(st.failure_rate, 4),
+                        "p50": round(st.p50, 4), "p95": round(st.p95, 4), "last_code": st.last_code})
+        else:
+            print(f"{st.p50:9.3f} {st.p95:9.3f} {st.failure_rate:6.0%} {st.runs:6d}  {path}")
+    return 0
+
+
+def cmd_agent(args):
+    from fleet import FleetAgent, is_loopback, format_address
+    token = args.token or os.environ.get(args.token_env, "")
+    if not token and not is_loopback(args.bind):
+        print("Агент, доступный по сети, запускается только с токеном (--token или "
+              f"переменная {args.token_env}).", file=sys.stderr)
+        return 2
+    try:
+        agent = FleetAgent(args.bind, args.port, token)
+    except OSError as e:
+        print(f"Не удалось открыть порт {args.port}: {e}", file=sys.stderr)
+        return 1
+    print(f"Агент слушает {format_address(agent.address)}", file=sys.stderr, flush=True)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_fleet(args):
+    import threading
+    from fleet import (FleetPool, FleetError, make_preset, load_preset, read_hosts, aggregate, parse_address,
+                       format_address)
+    hosts = [h.strip() for spec in args.hosts or () for h in spec.split(",") if h.strip()]
+    try:
+        for path in args.hosts_file or ():
+            hosts.extend(read_hosts(path))
+        preset = load_preset(args.preset) if args.preset else make_preset()
+    except (OSError, ValueError, FleetError) as e:
+        print(f"Ошибка чтения: {e}", file=sys.stderr)
+        return 2
+    # ключи командной строки дополняют и переопределяют пресет
+    preset["categories"] += args.category or []
+    preset["tweaks"] += args.tweak or []
+    for key in ("parallel", "timeout"):
+        if getattr(args, key) is not None:
+            preset[key] = getattr(args, key)
+    preset["force"] = preset["force"] or args.force
+    preset["coalesce"] = preset["coalesce"] or args.coalesce
+    # адреса проверяем до рассылки, как и окно флота; одинаковые в разной записи схлопываются
+    bad = []
+    for i, host in enumerate(hosts):
+        try:
+            hosts[i] = format_address(parse_address(host))
+        except ValueError:
+            bad.append(host)
+    if bad:
+        print(f"Неверный адрес агента: {', '.join(bad)}", file=sys.stderr)
+        return 2
+    hosts = list(dict.fromkeys(hosts))
+    if not hosts:
+        print("Не указан ни один агент (--hosts или --hosts-file).", file=sys.stderr)
+        return 2
+    if not preset["categories"] and not preset["tweaks"]:
+        print("Пресет пуст: укажите --preset, --category или --tweak.", file=sys.stderr)
+        return 2
+    pool = FleetPool(args.token or os.environ.get(args.token_env, ""), fanout=args.fanout)
+    out_lock = threading.Lock()
+
+    def on_event(agent, msg):
+        event = msg.get("event")
+        with out_lock:
+            if args.json:
+                _emit_json(dict({k: v for k, v in msg.items() if k != "id"}, agent=agent))
+                return
+            name = os.path.basename(msg.get("tweak") or "")
+            if event == "batch_start":
+                print(f"[{agent}] начат пакет: {msg.get('total')} твиков", flush=True)
+            elif event == "line":
+                print(f"[{agent}] [{name}] {msg.get('text')}", flush=True)
+            elif event == "skipped":
+                print(f"[{agent}] [SKIP] {name} {msg.get('reason')}, пропущен", flush=True)
+            elif event == "timeout":
+                print(f"[{agent}] [TIMEOUT] {name} превысил лимит {msg.get('timeout')} с", flush=True)
+            elif event == "exit":
+                status = "[OK]" if msg.get("code") == 0 else f"[ERR {msg.get('code')}]"
+                print(f"[{agent}] {status} {name}", flush=True)
+            elif event == "error":
+                print(f"[{agent}] [EXCEPTION] {name + ': ' if name else ''}{msg.get('error')}", flush=True)
+            elif event == "summary":
+                print(f"[{agent}] готово: {msg.get('ok')} из {msg.get('total')} успешно, ошибок: {msg.get('failed')}, "
+                      f"время: {msg.get('duration')} с" + (" (отменено)" if msg.get("cancelled") else ""), flush=True)
+
+    try:
+        results = pool.dispatch(hosts, preset, on_event)
+    except KeyboardInterrupt:
+        pool.cancel()
+        pool.close()
+        return 130
+    pool.close()
+    total = aggregate(results)
+    if args.json:
+        for r in results:
+            _emit_json(dict(r.as_dict(), event="agent_result"))
+        _emit_json(dict(total, event="fleet_summary"))
+    else:
+        for r in results:
+            state = f"нет связи: {r.error}" if r.error else f"{r.ok}/{r.total} успешно, ошибок: {r.failed}"
+            print(f"{r.address:<24} {r.host or '-':<20} {r.duration:9.3f} с  {state}")
+        print(f"Агентов: {total['agents']}, без ошибок: {total['agents_ok']}, с ошибками: {total['agents_failed']}, "
+              f"недоступно: {total['agents_unreachable']}; твиков успешно: {total['tweaks_ok']}, ошибок: {total['tweaks_failed']}")
+    if any(r.cancelled for r in results):
+        return 130
+    return 0 if all(r.success for r in results) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="optimizer", description="Windows Tweaks Optimizer")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("gui", help="открыть окно (по умолчанию)")
+    p_list = sub.add_parser("list", help="показать категории или твики категории")
+    p_list.add_argument("--category", action="append", help="категория (папка относительно tweaks)")
+    p_list.add_argument("--json", action="store_true", help="вывод в формате JSON lines")
+    p_run = sub.add_parser("run", help="применить твики без окна")
+    p_run.add_argument("--category", action="append", help="запустить все твики категории (можно несколько раз)")
+    p_run.add_argument("--tweak", action="append", help="имя файла или путь твика (можно несколько раз)")
+    p_run.add_argument("--parallel", type=int, default=1, help="число одновременно запущенных твиков")
+    p_run.add_argument("--timeout", type=float, default=None, help="таймаут на один твик, секунд")
+    p_run.add_argument("--force", action="store_true", help="запускать и уже применённые идемпотентные твики")
+    p_run.add_argument("--coalesce", action="store_true",
+                       help="выполнять .bat/.cmd, .ps1 и .reg группами в одном процессе интерпретатора")
+    p_run.add_argument("--json", action="store_true", help="вывод событий в формате JSON lines")
+    p_log = sub.add_parser("log", help="показать журнал запусков")
+    p_log.add_argument("--tweak", help="имя файла или путь твика")
+    p_log.add_argument("--host", help="имя компьютера")
+    p_log.add_argument("--since", help="не раньше указанного времени (ISO, например 2025-01-31T12:00)")
+    p_log.add_argument("--failed", action="store_true", help="только завершившиеся с ошибкой")
+    p_log.add_argument("--json", action="store_true", help="вывод в формате JSON lines")
+    p_stats = sub.add_parser("stats", help="статистика времени выполнения по истории (медиана, p95, доля ошибок)")
+    p_stats.add_argument("--json", action="store_true", help="вывод в формате JSON lines")
+    from fleet import DEFAULT_PORT, DEFAULT_FANOUT, TOKEN_ENV
+    p_agent = sub.add_parser("agent", help="агент флота: принимать пакеты твиков по сети")
+    p_agent.add_argument("--bind", default="127.0.0.1", help="адрес для прослушивания (по умолчанию только локально)")
+    p_agent.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP-порт")
+    p_agent.add_argument("--token", help=f"общий токен (по умолчанию из переменной {TOKEN_ENV})")
+    p_agent.set_defaults(token_env=TOKEN_ENV)
+    p_fleet = sub.add_parser("fleet", help="применить пресет на нескольких компьютерах через агентов")
+    p_fleet.add_argument("--hosts", action="append", help="агенты через запятую: host или host:port")
+    p_fleet.add_argument("--hosts-file", action="append", help="файл со списком агентов, по одному на строку")
+    p_fleet.add_argument("--preset", help="JSON-файл пресета: categories, tweaks, parallel, timeout, force, coalesce")
+    p_fleet.add_argument("--category", action="append", help="категория (можно несколько раз)")
+    p_fleet.add_argument("--tweak", action="append", help="имя файла или путь твика относительно папки агента")
+    p_fleet.add_argument("--parallel", type=int, default=None, help="число одновременно запущенных твиков на агенте")
+    p_fleet.add_argument("--timeout", type=float, default=None, help="таймаут на один твик, секунд")
+    p_fleet.add_argument("--force", action="store_true", help="запускать и уже применённые идемпотентные твики")
+    p_fleet.add_argument("--coalesce", action="store_true", help="выполнять твики группами в одном процессе")
+    p_fleet.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help="сколько агентов обрабатывать одновременно")
+    p_fleet.add_argument("--token", help=f"общий токен (по умолчанию из переменной {TOKEN_ENV})")
+    p_fleet.add_argument("--json", action="store_true", help="вывод событий в формате JSON lines")
+    p_fleet.set_defaults(token_env=TOKEN_ENV)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in (None, "gui"):
+        from gui import main as gui_main
+        return gui_main()
+    if args.command == "fleet":
+        # контроллеру своя папка твиков не нужна - твики выбираются на агентах
+        return cmd_fleet(args)
+    from core import TWEAKS_DIR
+    if not os.path.isdir(TWEAKS_DIR):
+        print("Отсутствует папка с твиками!", file=sys.stderr)
+        return 1
+    if args.command == "list":
+        return cmd_list(args)
+    if args.command == "log":
+        return cmd_log(args)
+    if args.command == "stats":
+        return cmd_stats(args)
+    if args.command == "agent":
+        return cmd_agent(args)
+    return cmd_run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import os
+import codecs
+import datetime
+import tempfile
+from preview import detect_encoding
+
+# --- Потоковый вывод процессов ---
+# Труба читается большими блоками (read1), кодировка выбирается один раз на поток и дальше
+# используется инкрементальный декодер; строки режутся по "\n" без копирования всего блока.
+# Строки длиннее MAX_LINE_CHARS выдаются частями. Когда объём вывода потока превышает
+# MEMORY_BUDGET, а также для двоичного вывода, данные больше не превращаются в события,
+# а дописываются в файл (spool-*.out), в терминал выводится только путь к нему.
+
+CHUNK_SIZE = 64 * 1024
+MAX_LINE_CHARS = 8 * 1024
+MEMORY_BUDGET = 8 * 1024 * 1024
+KEEP_SPOOLS = 20
+SNIFF_BYTES = 4096
+TEXT_CONTROLS = b"\t\n\x0b\x0c\r\x08\x1b\x07"
+
+
+def classify(head):
+    # Первый блок потока: "binary", кодировка с BOM/UTF-16 или None (решаем по первым не-ASCII байтам)
+    sample = head[:SNIFF_BYTES]
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if b"\x00" in sample:
+        # UTF-16LE без BOM (wmic и т.п.): нули стоят на нечётных позициях
+        odd = sample[1::2]
+        if len(odd) >= 2 and odd.count(0) >= len(odd) * 0.9 and sample[0::2].count(0) <= len(odd) * 0.1:
+            return "utf-16-le"
+        return "binary"
+    controls = len(sample) - len(sample.translate(None, bytes(range(32)))) - sum(sample.count(c) for c in TEXT_CONTROLS)
+    if controls > len(sample) * 0.1:
+        return "binary"
+    return None
+
+
+class LineSplitter:
+    # Байты потока -> строки без завершающих пробелов (как раньше rstrip на каждую строку)
+    def __init__(self, max_line=MAX_LINE_CHARS):
+        self.max_line = max_line
+        self.encoding = None
+        self.binary = False
+        self._decoder = None
+        self._first = True
+        self._partial = ""
+
+    def feed(self, data):
+        if self.binary:
+            return []
+        if self._first:
+            self._first = False
+            kind = classify(data)
+            if kind == "binary":
+                self.binary = True
+                return []
+            if kind is not None:
+                self._set_encoding(kind)
+        if self._decoder is not None:
+            text = self._decoder.decode(data)
+        elif data.isascii():
+            # пока поток чисто ASCII, кодировку не выбираем
+            text = data.decode("ascii")
+        else:
+            self._set_encoding(detect_encoding(data[:SNIFF_BYTES]))
+            text = self._decoder.decode(data)
+        return self._split(text)
+
+    def _set_encoding(self, encoding):
+        self.encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    def _split(self, text):
+        lines = text.split("\n")
+        if self._partial:
+            lines[0] = self._partial + lines[0]
+        partial = lines.pop()
+        if lines:
+            lines = [line.rstrip() for line in lines]
+        while len(partial) > self.max_line:
+            lines.append(partial[:self.max_line])
+            partial = partial[self.max_line:]
+        self._partial = partial
+        return lines
+
+    def finish(self):
+        if self.binary:
+            return []
+        tail = self._partial + (self._decoder.decode(b"", final=True) if self._decoder is not None else "")
+        self._partial = ""
+        return [tail.rstrip()] if tail.strip() else []
+
+
+def prune_spools(spool_dir, keep=KEEP_SPOOLS):
+    try:
+        spools = sorted(f for f in os.listdir(spool_dir) if f.startswith("spool-") and f.endswith(".out"))
+    except OSError:
+        return
+    for name in spools[:-keep]:
+        try:
+            os.remove(os.path.join(spool_dir, name))
+        except OSError:
+            pass
+
+
+class OutputSpool:
+    # Вывод одного потока одного твика: feed(bytes) -> строки для событий "line"
+    def __init__(self, label, stream, spool_dir=None, budget=MEMORY_BUDGET):
+        self.label = label
+        self.stream = stream
+        self.spool_dir = spool_dir or tempfile.gettempdir()
+        self.budget = budget
+        self.splitter = LineSplitter()
+        self.emitted = 0
+        self.spooled = 0
+        self.spool_path = None
+        self._file = None
+
+    def feed(self, data):
+        if self._file is not None:
+            self._write(data)
+            return []
+        lines = self.splitter.feed(data)
+        if self.splitter.binary:
+            self._open()
+            self._write(data)
+            return [f"[двоичный вывод, сохраняется в {self.spool_path}]"]
+        self.emitted += len(data)
+        if self.emitted > self.budget:
+            self._open()
+            lines += self.splitter.finish()
+            lines.append(f"[вывод больше {self.budget // (1024 * 1024)} МБ, остальное сохраняется в {self.spool_path}]")
+        return lines
+
+    def finish(self):
+        if self._file is None:
+            return self.splitter.finish()
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+        return [f"[сохранено {self.spooled} байт в {self.spool_path}]"]
+
+    def _open(self):
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in self.label)
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            prune_spools(self.spool_dir, KEEP_SPOOLS - 1)
+            self.spool_path = os.path.join(self.spool_dir, f"spool-{stamp}-{safe}-{self.stream}.out")
+            self._file = open(self.spool_path, "wb")
+        except OSError:
+            # писать некуда - лишний вывод просто отбрасывается
+            self.spool_path = os.devnull
+            self._file = open(os.devnull, "wb")
+
+    def _write(self, data):
+        try:
+            self._file.write(data)
+            self.spooled += len(data)
+        except OSError:
+            pass
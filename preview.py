@@ -0,0 +1,131 @@
+import os
+import mmap
+import codecs
+import queue
+import threading
+from collections import OrderedDict
+
+# --- Предпросмотр твиков ---
+# Читается только начало файла (через mmap), кодировка определяется по прочитанным байтам,
+# готовый текст хранится в LRU-кэше по ключу (путь, размер, mtime) с ограничением по памяти.
+
+MAX_PREVIEW_BYTES = 64 * 1024
+MAX_PREVIEW_LINES = 500
+CACHE_LIMIT_BYTES = 16 * 1024 * 1024
+ENTRY_OVERHEAD = 200  # ключ и узел OrderedDict
+BINARY_EXTS = (".exe", ".pow")
+
+
+def read_head(path, max_bytes=MAX_PREVIEW_BYTES):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return b"", 0
+        length = min(size, max_bytes)
+        try:
+            with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ) as m:
+                return m[:length], size
+        except (OSError, ValueError):
+            return f.read(length), size
+
+
+def detect_encoding(head):
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "utf-16"
+    try:
+        # последний символ мог обрезаться на границе чтения, поэтому final=False
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    # cp1251: кириллица в 0xC0-0xFF; cp866: в 0x80-0xAF и 0xE0-0xEF (0xB0-0xDF - псевдографика)
+    high = sum(1 for b in head if b >= 0xC0)
+    low = sum(1 for b in head if 0x80 <= b < 0xB0)
+    return "cp1251" if high > low else "cp866"
+
+
+def render_preview(head, size, encoding, max_lines=MAX_PREVIEW_LINES):
+    text = head.decode(encoding, errors="replace").replace("\r\n", "\n")
+    lines = text.splitlines(keepends=True)
+    if len(lines) > max_lines:
+        return "".join(lines[:max_lines]) + f"\n... (файл обрезан, показано {max_lines} строк, размер файла: {size} байт)"
+    if len(head) < size:
+        return text + f"\n... (файл обрезан, показано {len(head)} из {size} байт)"
+    return text
+
+
+def read_preview(path, max_lines=MAX_PREVIEW_LINES, encoding=None):
+    head, size = read_head(path)
+    return render_preview(head, size, encoding or detect_encoding(head), max_lines)
+
+
+class PreviewCache:
+    def __init__(self, limit_bytes=CACHE_LIMIT_BYTES):
+        self.limit_bytes = limit_bytes
+        self.used = 0
+        self.items = OrderedDict()  # (path, size, mtime) -> текст
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cost(text):
+        return len(text) * 2 + ENTRY_OVERHEAD
+
+    def get(self, key):
+        with self._lock:
+            text = self.items.get(key)
+            if text is not None:
+                self.items.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        cost = self._cost(text)
+        if cost > self.limit_bytes:
+            return
+        with self._lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.used -= self._cost(old)
+            self.items[key] = text
+            self.used += cost
+            while self.used > self.limit_bytes and self.items:
+                _old_key, old = self.items.popitem(last=False)
+                self.used -= self._cost(old)
+
+
+class PreviewLoader:
+    def __init__(self, cache=None, max_lines=MAX_PREVIEW_LINES):
+        self.cache = cache or PreviewCache()
+        self.max_lines = max_lines
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _load(self, tw):
+        key = (tw.path, tw.size, tw.mtime)
+        text = self.cache.get(key)
+        if text is not None:
+            return text
+        try:
+            head, size = read_head(tw.path)
+            text = render_preview(head, size, detect_encoding(head), self.max_lines)
+        except Exception as e:
+            return f"Ошибка чтения: {e}"
+        self.cache.put(key, text)
+        return text
+
+    def get(self, tw):
+        return self._load(tw)
+
+    def prefetch(self, tweaks):
+        # Соседние строки подгружаются в фоне, чтобы переход по списку был без задержки
+        for tw in tweaks:
+            if tw.ext not in BINARY_EXTS:
+                self._queue.put(tw)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="preview-prefetch", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        while True:
+            self._load(self._queue.get())
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+from collections import deque
+
+# --- Профилирование ---
+# Интервалы (span) вокруг горячих мест, время запуска и жизни процессов твиков и задержка главного
+# цикла Tk. Включается настройкой "profiling" или переменной OPTIMIZER_PROFILE=1; выключенный
+# профилировщик стоит одну проверку флага. Данные выгружаются в Chrome trace (chrome://tracing,
+# Perfetto) или speedscope; если задан OPTIMIZER_PROFILE_OUT, трасса пишется туда при выходе.
+
+PROFILE_ENV = "OPTIMIZER_PROFILE"
+PROFILE_OUT_ENV = "OPTIMIZER_PROFILE_OUT"
+MAX_EVENTS = 200000
+MAX_COUNTERS = 50000
+MAX_SAMPLES = 1024  # последних длительностей на интервал - для p50/p95 в сводке
+LAG_INTERVAL_MS = 100
+LAG_THRESHOLD_MS = 50
+LAG_TRACK = "Tk lag"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class SpanStats:
+    __slots__ = ("name", "count", "total", "mean", "p50", "p95", "max")
+
+    def __init__(self, name, count, total, worst, samples):
+        samples = sorted(samples)
+        self.name = name
+        self.count = count
+        self.total = total
+        self.mean = total / count if count else 0.0
+        self.p50 = _percentile(samples, 0.5)
+        self.p95 = _percentile(samples, 0.95)
+        self.max = worst
+
+
+class _SpanTotals:
+    # Нарастающие итоги по одному имени: сводка не перебирает буфер событий
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.samples.append(duration)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "cat", "args", "start")
+
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter(), self.cat, self.args)
+        return False
+
+
+class Profiler:
+    # События хранятся в кольцевом буфере: (имя, категория, начало, конец, дорожка, args); время - perf_counter
+    def __init__(self, enabled=False, capacity=MAX_EVENTS):
+        self.enabled = enabled
+        self.epoch = time.perf_counter()
+        self.wall_epoch = time.time()
+        self._events = deque(maxlen=capacity)
+        self._counters = deque(maxlen=MAX_COUNTERS)
+        self._tracks = {}  # ident потока или имя дорожки -> (номер, подпись)
+        self._totals = {}  # имя интервала -> _SpanTotals
+        self._lock = threading.Lock()
+        self._totals_lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def clear(self):
+        self._events.clear()
+        self._counters.clear()
+        with self._totals_lock:
+            self._totals = {}
+
+    def span(self, name, cat="app", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args or None)
+
+    def _track(self, track):
+        key = threading.get_ident() if track is None else track
+        info = self._tracks.get(key)
+        if info is None:
+            with self._lock:
+                info = self._tracks.get(key)
+                if info is None:
+                    label = threading.current_thread().name if track is None else track
+                    info = self._tracks[key] = (len(self._tracks) + 1, label)
+        return info[0]
+
+    def record(self, name, start, end, cat="app", args=None, track=None):
+        # Интервал, измеренный вызывающим (например, жизнь процесса); track - отдельная дорожка вместо потока
+        if self.enabled:
+            self._events.append((name, cat, start, end, self._track(track), args))
+            with self._totals_lock:
+                totals = self._totals.get(name)
+                if totals is None:
+                    totals = self._totals[name] = _SpanTotals()
+                totals.add(end - start)
+
+    def counter(self, name, value, track=None):
+        if self.enabled:
+            self._counters.append((name, time.perf_counter(), value, self._track(track)))
+
+    def events(self):
+        return list(self._events)
+
+    def summary(self):
+        # [SpanStats] по именам интервалов с последнего clear(), сначала самые затратные по суммарному времени;
+        # перцентили - по последним MAX_SAMPLES вызовам
+        with self._totals_lock:
+            stats = [SpanStats(name, t.count, t.total, t.max, list(t.samples)) for name, t in self._totals.items()]
+        return sorted(stats, key=lambda s: s.total, reverse=True)
+
+    def _us(self, t):
+        return round((t - self.epoch) * 1e6, 3)
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        trace = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "Optimizer"}}]
+        for tid, label in sorted(self._tracks.values()):
+            trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": label}})
+        for name, cat, start, end, tid, args in self.events():
+            event = {"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid, "ts": self._us(start),
+                     "dur": round((end - start) * 1e6, 3)}
+            if args:
+                event["args"] = args
+            trace.append(event)
+        for name, t, value, tid in list(self._counters):
+            trace.append({"name": name, "ph": "C", "pid": pid, "tid": tid, "ts": self._us(t), "args": {name: value}})
+        return {"traceEvents": trace, "displayTimeUnit": "ms",
+                "otherData": {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.wall_epoch))}}
+
+    def speedscope(self):
+        # Формат "evented": на каждую дорожку свой профиль; вложенность восстанавливается по времени,
+        # интервал, вылезающий за родителя, обрезается по его концу
+        frames = []
+        frame_ids = {}
+        by_track = {}
+        for name, _cat, start, end, tid, _args in self.events():
+            if name not in frame_ids:
+                frame_ids[name] = len(frames)
+                frames.append({"name": name})
+            by_track.setdefault(tid, []).append((start, end, frame_ids[name]))
+        labels = dict(self._tracks.values())
+        profiles = []
+        for tid in sorted(by_track):
+            spans = sorted(by_track[tid], key=lambda s: (s[0], -s[1]))
+            events = []
+            stack = []
+            for start, end, frame in spans:
+                while stack and stack[-1][0] <= start:
+                    close_at, closed = stack.pop()
+                    events.append({"type": "C", "frame": closed, "at": self._ms(close_at)})
+                if stack:
+                    end = min(end, stack[-1][0])
+                events.append({"type": "O", "frame": frame, "at": self._ms(start)})
+                stack.append((end, frame))
+            while stack:
+                close_at, closed = stack.pop()
+                events.append({"type": "C", "frame": closed, "at": self._ms(close_at)})
+            profiles.append({"type": "evented", "name": labels.get(tid, str(tid)), "unit": "milliseconds",
+                             "startValue": events[0]["at"], "endValue": events[-1]["at"], "events": events})
+        return {"$schema": SPEEDSCOPE_SCHEMA, "shared": {"frames": frames}, "profiles": profiles,
+                "name": "Optimizer", "exporter": "optimizer"}
+
+    def _ms(self, t):
+        return round((t - self.epoch) * 1e3, 4)
+
+    def export(self, path):
+        # *.speedscope.json - формат speedscope, остальное - Chrome trace
+        data = self.speedscope() if path.lower().endswith(".speedscope.json") else self.chrome_trace()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+
+_profiler = Profiler(enabled=os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+                     or bool(os.environ.get(PROFILE_OUT_ENV)))
+
+
+def get_profiler():
+    return _profiler
+
+
+def profiled(name=None, cat="app"):
+    # Декоратор: интервал на каждый вызов функции, пока профилировщик включён
+    def wrap(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _profiler.record(label, start, time.perf_counter(), cat)
+        return wrapper
+    return wrap
+
+
+def _export_at_exit():
+    path = os.environ.get(PROFILE_OUT_ENV)
+    if path and _profiler.enabled and _profiler._events:
+        try:
+            _profiler.export(path)
+        except OSError:
+            pass
+
+
+atexit.register(_export_at_exit)
+
+
+class LagMonitor:
+    # Пульс главного цикла: after(interval) должен сработать через interval мс,
+    # всё опоздание сверх этого - время, когда цикл Tk был занят чем-то другим
+    def __init__(self, widget, profiler=None, interval_ms=LAG_INTERVAL_MS, threshold_ms=LAG_THRESHOLD_MS):
+        self.widget = widget
+        self.profiler = profiler or _profiler
+        self.interval_ms = interval_ms
+        self.threshold = threshold_ms / 1000.0
+        self.samples = deque(maxlen=MAX_COUNTERS)
+        self._expected = None
+        self._after = None
+
+    @property
+    def running(self):
+        return self._after is not None
+
+    def start(self):
+        if self._after is None:
+            self._schedule()
+        return self
+
+    def stop(self):
+        if self._after is not None:
+            try:
+                self.widget.after_cancel(self._after)
+            except Exception:
+                pass
+            self._after = None
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000.0
+        self._after = self.widget.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        self.samples.append(lag)
+        self.profiler.counter("tk_lag_ms", round(lag * 1000, 2), LAG_TRACK)
+        if lag >= self.threshold:
+            self.profiler.record("tk.lag", self._expected, now, "lag", {"lag_ms": round(lag * 1000, 1)}, LAG_TRACK)
+        self._schedule()
+
+    def stats(self):
+        # (число замеров, медиана, p95, максимум, сколько раз выше порога), секунды
+        values = sorted(self.samples)
+        return (len(values), _percentile(values, 0.5), _percentile(values, 0.95), values[-1] if values else 0.0,
+                sum(1 for v in values if v >= self.threshold))
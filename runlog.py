@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import queue
+import atexit
+import socket
+import datetime
+import threading
+
+# --- Журнал запусков ---
+# Записи в формате JSON lines пишет фоновый поток: файл открыт постоянно,
+# запись идёт пачками, fsync - не чаще раза в FSYNC_INTERVAL секунд или FSYNC_EVERY записей.
+# При превышении MAX_LOG_BYTES файл переименовывается в .1, .2 ... (хранится KEEP_FILES штук).
+
+MAX_LOG_BYTES = 10 * 1024 * 1024
+KEEP_FILES = 5
+FSYNC_EVERY = 200
+FSYNC_INTERVAL = 2.0
+
+HOST = socket.gethostname()
+
+
+def _now_iso(ts=None):
+    return datetime.datetime.fromtimestamp(ts if ts is not None else time.time()).isoformat(timespec="milliseconds")
+
+
+class RunLogger:
+    def __init__(self, path, max_bytes=MAX_LOG_BYTES, keep_files=KEEP_FILES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self._queue = queue.Queue()
+        self._file = None
+        self._thread = threading.Thread(target=self._worker, name="run-logger", daemon=True)
+        self._thread.start()
+
+    def log(self, record):
+        record.setdefault("ts", _now_iso())
+        record.setdefault("host", HOST)
+        self._queue.put(record)
+
+    def log_action(self, action):
+        self.log({"event": "action", "action": action})
+
+    def record(self, tw, result):
+        # Вызывается движком после завершения каждого твика
+        self.log({
+            "event": "run",
+            "tweak": tw.path,
+            "name": tw.name,
+            "start": _now_iso(result.started),
+            "duration": round(result.duration, 4),
+            "exit_code": result.code,
+            "timed_out": result.timed_out,
+            "stdout_bytes": result.stdout_bytes,
+            "stderr_bytes": result.stderr_bytes,
+            "error": result.error,
+        })
+
+    def flush(self, timeout=5):
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.keep_files - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _worker(self):
+        unsynced = 0
+        last_sync = time.monotonic()
+        while True:
+            try:
+                items = [self._queue.get(timeout=FSYNC_INTERVAL)]
+            except queue.Empty:
+                items = []
+            while len(items) < 1000:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = [i for i in items if isinstance(i, threading.Event)]
+            records = [i for i in items if not isinstance(i, threading.Event)]
+            try:
+                if records:
+                    f = self._open()
+                    f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+                    f.flush()
+                    unsynced += len(records)
+                if self._file is not None and unsynced and (waiters or unsynced >= FSYNC_EVERY or time.monotonic() - last_sync >= FSYNC_INTERVAL):
+                    os.fsync(self._file.fileno())
+                    unsynced = 0
+                    last_sync = time.monotonic()
+                if self._file is not None and self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except Exception:
+                pass
+            for w in waiters:
+                w.set()
+
+
+def query(path, tweak=None, event=None, host=None, since=None, failed=None, keep_files=KEEP_FILES):
+    # Перебор записей журнала (включая ротированные файлы) от старых к новым.
+    # since - строка ISO-времени; failed=True - только завершившиеся с ошибкой
+    files = [f"{path}.{i}" for i in range(keep_files, 0, -1)] + [path]
+    for name in files:
+        try:
+            f = open(name, "r", encoding="utf-8")
+        except OSError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if tweak is not None and rec.get("tweak") != tweak and rec.get("name") != tweak:
+                    continue
+                if event is not None and rec.get("event") != event:
+                    continue
+                if host is not None and rec.get("host") != host:
+                    continue
+                if since is not None and rec.get("ts", "") < since:
+                    continue
+                if failed is not None and (rec.get("exit_code") not in (0, None) or rec.get("error") is not None) != failed:
+                    continue
+                yield rec
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_logger(path):
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            logger = _loggers[path] = RunLogger(path)
+            atexit.register(logger.flush)
+        return logger
@@ -0,0 +1,118 @@
+import os
+import json
+import math
+
+# --- Планировщик пакета твиков ---
+# Метаданные (необязательные):
+#   <папка>/optimizer.meta.json   {"serial": true, "timeout": 60}
+#       serial  - твики этой папки выполняются строго по одному
+#       timeout - таймаут по умолчанию для твиков папки (секунды)
+#   <твик>.meta.json (рядом со скриптом, например tweak.bat.meta.json)
+#       {"timeout": 120, "after": ["other.bat", "Папка/x.reg"], "serial": false, "idempotent": true}
+#       after   - запускать после указанных твиков (имя файла или путь от папки твиков),
+#                 учитывается только если они тоже выбраны
+#       idempotent - повторный запуск ничего не меняет: твик пропускается, если этот же
+#                 файл (по хэшу содержимого) уже успешно применялся (можно задать и для папки)
+
+FOLDER_META_FILE = "optimizer.meta.json"
+SIDECAR_SUFFIX = ".meta.json"
+
+
+class Job:
+    __slots__ = ("tweak", "deps", "group", "timeout", "idempotent")
+
+    def __init__(self, tweak, deps=(), group=None, timeout=None, idempotent=False):
+        self.tweak = tweak
+        self.deps = set(deps)
+        self.group = group
+        self.timeout = timeout
+        self.idempotent = idempotent
+
+
+def read_meta(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _parse_timeout(value):
+    # (годится?, значение): null/0 - без таймаута, иначе положительное число секунд (строка "5" тоже подходит)
+    if value is None or isinstance(value, bool):
+        return value is None, None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return False, None
+    if value == 0:
+        return True, None
+    return (True, value) if value > 0 and math.isfinite(value) else (False, None)
+
+
+def _parse_flag(value):
+    return (True, value) if isinstance(value, bool) else (False, False)
+
+
+def _from_meta(key, parse, sources, default):
+    # Значение из первого источника, где ключ задан корректно; неверные значения пропускаются
+    for source in sources:
+        if key in source:
+            ok, value = parse(source[key])
+            if ok:
+                return value
+    return default
+
+
+def _after_refs(value):
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [ref for ref in value if isinstance(ref, str) and ref]
+    return []
+
+
+def _norm(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def plan_batch(tweaks, tweaks_dir, default_timeout=None):
+    folder_meta = {}
+    by_name = {}
+    by_path = {}
+    for tw in tweaks:
+        by_name.setdefault(tw.name.lower(), []).append(tw.path)
+        by_path[_norm(tw.path)] = tw.path
+    default_timeout = _parse_timeout(default_timeout)[1]
+    jobs = []
+    for tw in tweaks:
+        folder = os.path.dirname(tw.path)
+        if folder not in folder_meta:
+            folder_meta[folder] = read_meta(os.path.join(folder, FOLDER_META_FILE))
+        fmeta = folder_meta[folder]
+        meta = read_meta(tw.path + SIDECAR_SUFFIX)
+        timeout = _from_meta("timeout", _parse_timeout, (meta, fmeta), default_timeout)
+        serial = _from_meta("serial", _parse_flag, (meta, fmeta), False)
+        idempotent = _from_meta("idempotent", _parse_flag, (meta, fmeta), False)
+        deps = set()
+        for ref in _after_refs(meta.get("after")):
+            candidates = [os.path.join(folder, ref), os.path.join(tweaks_dir, ref), ref]
+            dep = next((by_path[_norm(c)] for c in candidates if _norm(c) in by_path), None)
+            if dep is None and len(by_name.get(ref.lower(), [])) == 1:
+                dep = by_name[ref.lower()][0]
+            if dep is not None and dep != tw.path:
+                deps.add(dep)
+        jobs.append(Job(tw, deps, group=folder if serial else None, timeout=timeout or None, idempotent=idempotent))
+    return jobs
+
+
+def next_ready(pending, done_paths, busy_groups):
+    # Первая задача по порядку, у которой выполнены зависимости и свободна группа
+    for job in pending:
+        if job.group is not None and job.group in busy_groups:
+            continue
+        if job.deps - done_paths:
+            continue
+        return job
+    return None
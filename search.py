@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import threading
+from array import array
+from preview import detect_encoding, MAX_PREVIEW_BYTES
+
+# --- Поиск по твикам ---
+# Триграммный инвертированный индекс по имени+папке и по содержимому скриптов.
+# Списки документов хранятся компактно - отсортированными array('I'); новые id всегда больше старых,
+# поэтому добавление в конец сохраняет порядок. Индекс сохраняется рядом с индексом каталога и
+# обновляется инкрементально: перечитываются только файлы с другим размером/mtime.
+# Удалённые документы помечаются и отсеиваются при запросе, при накоплении списки уплотняются.
+# Тексты скриптов в памяти не хранятся: кандидаты по триграммам проверяются чтением файла,
+# поэтому query() вызывается из фонового потока.
+
+TEXT_EXTS = (".bat", ".cmd", ".vbs", ".ps1", ".reg")
+MAX_CONTENT_BYTES = 256 * 1024
+SHORT_QUERY = 3
+MAX_INTERSECT = 3  # кандидаты всё равно проверяются - пересекаем только самые редкие триграммы
+MAX_HITS = 2000
+INDEX_VERSION = 1
+ID_TYPE = "I" if array("I").itemsize == 4 else "L"
+
+
+def trigrams(text):
+    return set(map("".join, zip(text, text[1:], text[2:])))
+
+
+def word_trigrams(text):
+    # Триграммы внутри слов: повторяющиеся слова скрипта разбираются один раз, а запрос из
+    # одной строки всё равно не может совпасть через перевод строки
+    return {word[i:i + 3] for word in set(text.split()) for i in range(len(word) - 2)}
+
+
+def read_text(path, limit=MAX_CONTENT_BYTES):
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(limit)
+    except OSError:
+        return ""
+    # кодировка как в предпросмотре: cp866/cp1251 иначе потеряли бы кириллицу
+    return raw.decode(detect_encoding(raw[:MAX_PREVIEW_BYTES]), errors="replace")
+
+
+def _intersect(postings):
+    if not postings or any(p is None for p in postings):
+        return set()
+    postings = sorted(postings, key=len)[:MAX_INTERSECT]
+    result = set(postings[0])
+    for p in postings[1:]:
+        result.intersection_update(p)
+        if not result:
+            break
+    return result
+
+
+def _append(postings, grams, doc_id):
+    for g in grams:
+        ids = postings.get(g)
+        if ids is None:
+            ids = postings[g] = array(ID_TYPE)
+        ids.append(doc_id)
+
+
+class SearchIndex:
+    def __init__(self, index_file=None):
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._loaded = index_file is None
+        self._next_id = 0
+        self.docs = {}  # path -> (doc_id, size, mtime)
+        self.tweaks = {}  # doc_id -> tweak
+        self.labels = {}  # doc_id -> "имя\nпапка" в нижнем регистре
+        self.meta_grams = {}  # триграмма -> array(id)
+        self.body_grams = {}
+        self.dead = set()
+        self.ready = False
+
+    def load(self):
+        # Заголовок - строка JSON, за ним подряд байты списков в порядке заголовка
+        self._loaded = True
+        try:
+            with open(self.index_file, "rb") as f:
+                header = json.loads(f.readline())
+                blob = memoryview(f.read())
+        except (OSError, ValueError):
+            return False
+        if (header.get("version") != INDEX_VERSION or header.get("byteorder") != sys.byteorder
+                or header.get("itemsize") != array(ID_TYPE).itemsize):
+            return False
+        size = array(ID_TYPE).itemsize
+        offset = 0
+        grams = []
+        try:
+            for key in ("meta", "body"):
+                postings = {}
+                for gram, count in header[key]:
+                    ids = postings[gram] = array(ID_TYPE)
+                    ids.frombytes(blob[offset:offset + count * size])
+                    offset += count * size
+                grams.append(postings)
+            docs = {path: tuple(doc) for path, doc in header["docs"].items()}
+            dead = set(header["dead"])
+            next_id = header["next_id"]
+        except (KeyError, TypeError, ValueError):
+            return False
+        if offset != len(blob):
+            return False
+        with self._lock:
+            self.meta_grams, self.body_grams = grams
+            self.docs = docs
+            self.dead = dead
+            self._next_id = next_id
+        return True
+
+    def save(self):
+        if self.index_file is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                lists = [(key, list(postings.items())) for key, postings in
+                         (("meta", self.meta_grams), ("body", self.body_grams))]
+                header = {"version": INDEX_VERSION, "byteorder": sys.byteorder, "itemsize": array(ID_TYPE).itemsize,
+                          "next_id": self._next_id, "docs": dict(self.docs), "dead": sorted(self.dead)}
+                for key, items in lists:
+                    header[key] = [(gram, len(ids)) for gram, ids in items]
+                chunks = [ids.tobytes() for _key, items in lists for _gram, ids in items]
+            tmp = self.index_file + ".tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+                    f.writelines(chunks)
+                os.replace(tmp, self.index_file)
+            except OSError:
+                pass
+
+    def _compact(self):
+        # Вычищаем удалённые id из списков, не перечитывая файлы
+        dead = self.dead
+        for postings in (self.meta_grams, self.body_grams):
+            for gram in list(postings):
+                ids = array(ID_TYPE, [i for i in postings[gram] if i not in dead])
+                if ids:
+                    postings[gram] = ids
+                else:
+                    del postings[gram]
+        self.dead = set()
+
+    def update(self, tweaks_by_folder, stop_event=None):
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            if len(self.dead) > max(1000, len(self.docs) // 2):
+                self._compact()
+            docs = dict(self.docs)
+        seen = set()
+        changed = False
+        for tws in list(tweaks_by_folder.values()):
+            for tw in tws:
+                if stop_event is not None and stop_event.is_set():
+                    if changed:
+                        self.save()
+                    return False
+                path = tw.path
+                seen.add(path)
+                label = (tw.name + "\n" + tw.folder).lower()
+                old = docs.get(path)
+                if old is not None and old[1] == tw.size and old[2] == tw.mtime:
+                    with self._lock:
+                        self.tweaks[old[0]] = tw
+                        self.labels[old[0]] = label
+                    continue
+                body = word_trigrams(read_text(path).lower()) if tw.ext in TEXT_EXTS else ()
+                self._add(tw, label, trigrams(label), body, old)
+                changed = True
+        with self._lock:
+            for path in [p for p in self.docs if p not in seen]:
+                doc_id = self.docs.pop(path)[0]
+                self.dead.add(doc_id)
+                self.tweaks.pop(doc_id, None)
+                self.labels.pop(doc_id, None)
+                changed = True
+            self.ready = True
+        if changed:
+            self.save()
+        return True
+
+    def _add(self, tw, label, meta, body, old):
+        with self._lock:
+            if old is not None:
+                self.dead.add(old[0])
+                self.tweaks.pop(old[0], None)
+                self.labels.pop(old[0], None)
+            doc_id = self._next_id
+            self._next_id += 1
+            self.docs[tw.path] = (doc_id, tw.size, tw.mtime)
+            self.tweaks[doc_id] = tw
+            self.labels[doc_id] = label
+            _append(self.meta_grams, meta, doc_id)
+            _append(self.body_grams, body, doc_id)
+
+    def query(self, text, limit=None, stop_event=None):
+        # Список твиков, совпавших по имени/папке, затем по содержимому; не больше limit.
+        # Содержимое кандидатов читается с диска - вызывать не из потока Tk. None - запрос отменён.
+        q = text.lower().strip()
+        if not q:
+            return []
+        limit = limit or sys.maxsize
+        with self._lock:
+            labels = self.labels
+            tweaks = self.tweaks
+            if len(q) < SHORT_QUERY:
+                result = []
+                for i, label in labels.items():
+                    if q in label:
+                        result.append(tweaks[i])
+                        if len(result) >= limit:
+                            break
+                return result
+            meta = _intersect([self.meta_grams.get(g) for g in trigrams(q)])
+            hits = [i for i in sorted(meta) if i in labels and q in labels[i]][:limit]
+            result = [tweaks[i] for i in hits]
+            grams = word_trigrams(q)
+            # запрос только из слов короче трёх букв ищется по имени и папке
+            body = _intersect([self.body_grams.get(g) for g in grams]) if grams else set()
+            body.difference_update(hits)
+            candidates = [tweaks[i] for i in sorted(body) if i in tweaks]
+        # триграммы дают только кандидатов - точное вхождение проверяется по файлу
+        for tw in candidates:
+            if len(result) >= limit:
+                break
+            if stop_event is not None and stop_event.is_set():
+                return None
+            if q in read_text(tw.path).lower():
+                result.append(tw)
+        return result
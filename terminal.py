@@ -0,0 +1,100 @@
+import os
+import datetime
+from collections import deque
+
+# --- Буферизированный вывод в терминал ---
+# Строки копятся в очереди и выводятся в виджет одним insert раз в кадр.
+# В виджете хранится не больше max_lines строк, полный вывод пишется в файл запуска.
+
+MAX_VISIBLE_LINES = 5000
+FRAME_MS = 33
+KEEP_RUNS = 20
+
+
+class TerminalSink:
+    def __init__(self, widget, runs_dir, max_lines=MAX_VISIBLE_LINES, frame_ms=FRAME_MS, keep_runs=KEEP_RUNS):
+        self.widget = widget
+        self.runs_dir = runs_dir
+        self.max_lines = max_lines
+        self.frame_ms = frame_ms
+        self.keep_runs = keep_runs
+        self.pending = deque(maxlen=max_lines)
+        self.visible = 0
+        self.run_file = None
+        self.run_path = None
+        self._scheduled = False
+
+    def write(self, text):
+        self.pending.extend(text.split("\n"))
+        if self.run_file is not None:
+            try:
+                self.run_file.write(text + "\n")
+            except Exception:
+                pass
+        if not self._scheduled:
+            self._scheduled = True
+            self.widget.after(self.frame_ms, self.flush)
+
+    def flush(self):
+        self._scheduled = False
+        if not self.pending:
+            return
+        lines = list(self.pending)
+        self.pending.clear()
+        w = self.widget
+        w.configure(state="normal")
+        w.insert("end", "\n".join(lines) + "\n")
+        self.visible += len(lines)
+        excess = self.visible - self.max_lines
+        if excess > 0:
+            w.delete("1.0", f"{excess + 1}.0")
+            self.visible -= excess
+        w.see("end")
+        w.configure(state="disabled")
+
+    def clear(self):
+        self.pending.clear()
+        self.visible = 0
+        self.widget.configure(state="normal")
+        self.widget.delete("1.0", "end")
+        self.widget.configure(state="disabled")
+
+    def begin_run(self):
+        self.end_run()
+        try:
+            os.makedirs(self.runs_dir, exist_ok=True)
+            name = datetime.datetime.now().strftime("run-%Y%m%d-%H%M%S-%f.log")
+            self.run_path = os.path.join(self.runs_dir, name)
+            self.run_file = open(self.run_path, "w", encoding="utf-8", buffering=1 << 16)
+        except Exception:
+            self.run_file = None
+            self.run_path = None
+        self._prune_runs()
+
+    def end_run(self):
+        if self.run_file is not None:
+            try:
+                self.run_file.close()
+            except Exception:
+                pass
+            self.run_file = None
+
+    def sync(self):
+        # Сбросить буфер файла на диск, чтобы его можно было открыть во время запуска
+        if self.run_file is not None:
+            try:
+                self.run_file.flush()
+            except Exception:
+                pass
+        return self.run_path
+
+    def _prune_runs(self):
+        try:
+            runs = sorted(f for f in os.listdir(self.runs_dir) if f.startswith("run-") and f.endswith(".log"))
+        except OSError:
+            return
+        for name in runs[:-self.keep_runs]:
+            try:
+                os.remove(os.path.join(self.runs_dir, name))
+            except OSError:
+                pass
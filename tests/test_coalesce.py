@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import pytest
+import coalesce
+from engine import BatchRunner
+from catalog import Tweak
+from scheduler import Job
+
+# На Linux cmd/PowerShell/reg заменены на sh (см. coalesce.py)
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="заменители интерпретаторов на sh")
+
+
+def make_tweak(folder, name, text):
+    path = os.path.join(folder, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.chmod(path, 0o755)
+    return Tweak(name, path, os.path.basename(folder))
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def on_result(self, job, result):
+        with self._lock:
+            self.results[job.tweak.name] = result
+
+    def lines(self, name):
+        return [data[1] for kind, tw, data in self.events if kind == "line" and tw is not None and tw.name == name]
+
+    def starts(self, name):
+        return sum(1 for kind, tw, _ in self.events if kind == "start" and tw.name == name)
+
+
+def run(jobs, rec, cancel_event=None):
+    return coalesce.run_session(jobs, rec.emit, cancel_event, rec.on_result)
+
+
+def test_marker_after_output_without_newline(tmp_path):
+    a = make_tweak(tmp_path, "a.bat", "#!/bin/sh\nprintf 'first\\n'\nprintf 'no-newline'\n")
+    b = make_tweak(tmp_path, "b.bat", "#!/bin/sh\necho second\nexit 3\n")
+    rec = Recorder()
+    left = run([Job(a), Job(b)], rec)
+    assert left == []
+    assert rec.lines("a.bat") == ["first", "no-newline"]
+    assert rec.lines("b.bat") == ["second"]
+    assert rec.results["a.bat"].code == 0
+    assert rec.results["b.bat"].code == 3
+
+
+def test_interpreter_exit_requeues_rest(tmp_path):
+    ok = make_tweak(tmp_path, "ok.bat", "#!/bin/sh\necho ok\n")
+    # убивает всю группу процессов, то есть и сам интерпретатор
+    killer = make_tweak(tmp_path, "killer.bat", "#!/bin/sh\necho dying\nkill -9 0\n")
+    rest = make_tweak(tmp_path, "rest.bat", "#!/bin/sh\necho rest\n")
+    jobs = [Job(ok), Job(killer), Job(rest)]
+    rec = Recorder()
+    left = run(jobs, rec)
+    assert left == [jobs[2]]
+    assert rec.results["ok.bat"].code == 0
+    assert rec.results["killer.bat"].code != 0
+    assert "rest.bat" not in rec.results
+    assert rec.starts("rest.bat") == 0
+
+
+def test_timeout_inside_session(tmp_path):
+    ok = make_tweak(tmp_path, "ok.bat", "#!/bin/sh\necho ok\n")
+    slow = make_tweak(tmp_path, "slow.bat", "#!/bin/sh\nsleep 30\n")
+    rest = make_tweak(tmp_path, "rest.bat", "#!/bin/sh\necho rest\n")
+    jobs = [Job(ok), Job(slow, timeout=0.5), Job(rest)]
+    rec = Recorder()
+    left = run(jobs, rec)
+    assert left == [jobs[2]]
+    assert ("timeout", slow, 0.5) in rec.events
+    assert rec.results["slow.bat"].timed_out
+    assert rec.results["slow.bat"].duration < 10
+    assert rec.results["ok.bat"].code == 0
+
+
+def test_failed_merged_reg_import_falls_back_once(tmp_path, monkeypatch):
+    # заменитель reg: сам .reg исполняется как сценарий sh, первая строка просто даёт ошибку
+    header = coalesce.REG_HEADER + "\n"
+    a = make_tweak(tmp_path, "a.reg", header + "echo applied-a\n")
+    b = make_tweak(tmp_path, "b.reg", header + "echo applied-b\n")
+    monkeypatch.setattr(coalesce, "REG_IMPORT_CMD", ["sh", "-c", "exit 1", "reg-import"])
+    rec = Recorder()
+    left = run([Job(a), Job(b)], rec)
+    assert left == []
+    assert rec.starts("a.reg") == 1
+    assert rec.starts("b.reg") == 1
+    assert "Общий импорт .reg не удался, импортируем по одному" in rec.lines("a.reg")
+    assert "applied-a" in rec.lines("a.reg")
+    assert "applied-b" in rec.lines("b.reg")
+    assert rec.results["a.reg"].code == 0
+    assert rec.results["b.reg"].code == 0
+
+
+def test_coalescing_keeps_batch_order(tmp_path):
+    # с одним потоком объединяются только подряд идущие твики одного вида
+    names = ["1_a.bat", "2_b.reg", "3_c.bat", "4_d.bat", "5_e.reg"]
+    tweaks = [make_tweak(tmp_path, name, "#!/bin/sh\necho ok\n") for name in names]
+    events = queue.Queue()
+    runner = BatchRunner(tweaks, events, max_workers=1, tweaks_dir=str(tmp_path), coalesce=True)
+    runner.start()
+    runner.thread.join(30)
+    started = []
+    while not events.empty():
+        kind, tw, _data = events.get()
+        if kind == "start":
+            started.append(tw.name)
+    assert started == names
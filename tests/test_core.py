@@ -0,0 +1,25 @@
+import os
+from catalog import Tweak, TweakCatalog
+from core import select_tweaks
+
+
+def make(folder, name):
+    return Tweak(name, os.path.join("tweaks", folder, name), folder)
+
+
+def paths(tweaks):
+    return [tw.path.replace(os.sep, "/") for tw in tweaks]
+
+
+def test_select_keeps_given_order():
+    catalog = TweakCatalog({"A": [make("A", "3_c.bat"), make("A", "1_a.bat"), make("A", "2_b.reg")],
+                            "B": [make("B", "z.bat")]})
+    chosen = select_tweaks(catalog, names=["3_c.bat", "z.bat", "1_a.bat", "tweaks/A/3_c.bat"])
+    assert paths(chosen) == ["tweaks/A/3_c.bat", "tweaks/B/z.bat", "tweaks/A/1_a.bat"]
+
+
+def test_select_category_sorted_by_name():
+    catalog = TweakCatalog({"A": [make("A", "3_c.bat"), make("A", "1_a.bat"), make("A", "2_b.reg")],
+                            "B": [make("B", "z.bat")]})
+    chosen = select_tweaks(catalog, categories=["B", "A"], names=["1_a.bat"])
+    assert paths(chosen) == ["tweaks/B/z.bat", "tweaks/A/1_a.bat", "tweaks/A/2_b.reg", "tweaks/A/3_c.bat"]
@@ -0,0 +1,121 @@
+import os
+import time
+import socket
+import threading
+import pytest
+import fleet
+from fleet import FleetAgent, FleetPool, make_preset, format_address
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="твики-заглушки на sh")
+
+TOKEN = "s3cret"
+
+
+def write_tweak(root, rel, text):
+    path = os.path.join(root, "tweaks", rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.chmod(path, 0o755)
+
+
+@pytest.fixture
+def agents(tmp_path, monkeypatch):
+    # Агенты в одном процессе работают с одной папкой твиков (текущий каталог)
+    write_tweak(tmp_path, "Cat/one.bat", "#!/bin/sh\necho one\n")
+    write_tweak(tmp_path, "Cat/two.bat", "#!/bin/sh\necho two\nexit 2\n")
+    write_tweak(tmp_path, "Slow/slow.bat", "#!/bin/sh\nsleep 30\n")
+    monkeypatch.chdir(tmp_path)
+    started = [FleetAgent("127.0.0.1", 0, TOKEN).start() for _ in range(2)]
+    yield [format_address(agent.address) for agent in started]
+    for agent in started:
+        agent.shutdown()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def collect():
+    events = []
+    lock = threading.Lock()
+
+    def on_event(agent, msg):
+        with lock:
+            events.append((agent, msg))
+    return events, on_event
+
+
+def test_dispatch_to_two_agents(agents):
+    pool = FleetPool(TOKEN, fanout=2)
+    events, on_event = collect()
+    results = pool.dispatch(agents, make_preset(["Cat"], force=True), on_event)
+    assert [r.address for r in results] == agents
+    for r in results:
+        assert (r.total, r.ok, r.failed, r.error) == (2, 1, 1, None)
+        lines = [msg["text"] for agent, msg in events if agent == r.address and msg.get("event") == "line"]
+        assert sorted(lines) == ["one", "two"]
+    assert fleet.aggregate(results)["tweaks_failed"] == 2
+    # соединения из пула переиспользуются
+    socks = [pool.connection(a).sock for a in agents]
+    pool.dispatch(agents, make_preset(tweaks=["tweaks/Cat/one.bat"], force=True))
+    assert [pool.connection(a).sock for a in agents] == socks
+    pool.close()
+
+
+def test_wrong_token(agents):
+    results = FleetPool("wrong").dispatch(agents[:1], make_preset(["Cat"]))
+    assert results[0].error == "неверный токен"
+    assert not results[0].success
+
+
+def test_unreachable_agent(agents):
+    missing = f"127.0.0.1:{free_port()}"
+    results = FleetPool(TOKEN, connect_timeout=2).dispatch([agents[0], missing], make_preset(tweaks=["one.bat"]))
+    assert results[0].success
+    assert results[1].error
+    assert fleet.aggregate(results)["agents_unreachable"] == 1
+
+
+def test_cancel(agents):
+    pool = FleetPool(TOKEN)
+    threading.Timer(0.5, pool.cancel).start()
+    begin = time.monotonic()
+    results = pool.dispatch(agents, make_preset(["Slow"]))
+    assert time.monotonic() - begin < 10
+    assert all(r.cancelled for r in results)
+    pool.close()
+
+
+def test_sender_close_does_not_block_when_peer_stops_reading(monkeypatch):
+    monkeypatch.setattr(fleet, "SEND_QUEUE", 4)
+    monkeypatch.setattr(fleet, "CLOSE_TIMEOUT", 0.2)
+    a, b = socket.socketpair()
+    sender = fleet._Sender(a)
+    chunk = {"text": "x" * (1024 * 1024)}
+    for _ in range(8):
+        threading.Thread(target=sender.send, args=(chunk,), daemon=True).start()
+    time.sleep(0.3)
+    begin = time.monotonic()
+    sender.close()
+    assert time.monotonic() - begin < 2
+    assert not sender.thread.is_alive()
+    a.close()
+    b.close()
+
+
+def test_parse_address_rejects_bad_input():
+    assert fleet.parse_address("[::1]:9000") == ("::1", 9000)
+    assert fleet.parse_address("host") == ("host", fleet.DEFAULT_PORT)
+    for text in ("foo:bar", "host:70000", ":80", ""):
+        with pytest.raises(ValueError):
+            fleet.parse_address(text)
+
+
+def test_cancel_after_connection_closed(agents):
+    conn = fleet.AgentConnection(fleet.parse_address(agents[0]), TOKEN)
+    conn.connect()
+    conn.close()
+    conn.cancel()
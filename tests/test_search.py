@@ -0,0 +1,72 @@
+import os
+import search
+from catalog import CatalogIndex, TweakCatalog
+from search import SearchIndex
+
+
+def make_catalog(tmp_path, files):
+    tweaks_dir = tmp_path / "tweaks"
+    for rel, data in files.items():
+        path = tweaks_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    index = CatalogIndex(str(tweaks_dir), str(tmp_path / "index.json"), (".bat", ".reg"))
+    return TweakCatalog(index.update())
+
+
+def names(tweaks):
+    return sorted(tw.name for tw in tweaks)
+
+
+def test_cyrillic_in_legacy_encodings(tmp_path):
+    catalog = make_catalog(tmp_path, {
+        "Сеть/dos.bat": "rem отключить телеметрию\r\n".encode("cp866"),
+        "Сеть/win.bat": "rem телеметрия\r\n".encode("cp1251"),
+        "Misc/other.bat": b"echo hello\r\n",
+    })
+    index = SearchIndex()
+    index.update(catalog.snapshot())
+    assert names(index.query("телеметр")) == ["dos.bat", "win.bat"]
+    assert names(index.query("hello")) == ["other.bat"]
+
+
+def test_saved_index_is_reused_without_reading_files(tmp_path, monkeypatch):
+    catalog = make_catalog(tmp_path, {"A/one.bat": b"reg add DisableTelemetry\n", "A/two.bat": b"powercfg\n"})
+    index_file = str(tmp_path / "search.bin")
+    SearchIndex(index_file).update(catalog.snapshot())
+
+    reads = []
+    read_text = search.read_text
+    monkeypatch.setattr(search, "read_text", lambda path, *a: reads.append(path) or read_text(path, *a))
+    index = SearchIndex(index_file)
+    index.update(catalog.snapshot())
+    assert reads == []
+    assert names(index.query("disabletelemetry")) == ["one.bat"]
+
+
+def test_changed_and_removed_files(tmp_path):
+    catalog = make_catalog(tmp_path, {"A/one.bat": b"echo alpha\n", "A/two.bat": b"echo beta\n"})
+    index = SearchIndex(str(tmp_path / "search.bin"))
+    index.update(catalog.snapshot())
+    os.remove(tmp_path / "tweaks" / "A" / "two.bat")
+    catalog = make_catalog(tmp_path, {"A/one.bat": b"echo gamma ray\n"})
+    index.update(catalog.snapshot())
+    assert index.query("alpha") == [] and index.query("beta") == []
+    assert names(index.query("gamma")) == ["one.bat"]
+    index._compact()
+    assert names(index.query("gamma")) == ["one.bat"]
+
+
+def test_limit_and_cancel(tmp_path):
+    catalog = make_catalog(tmp_path, {f"A/t{i}.bat": b"echo common\n" for i in range(20)})
+    index = SearchIndex()
+    index.update(catalog.snapshot())
+    assert len(index.query("common")) == 20
+    assert len(index.query("common", limit=5)) == 5
+
+    class Stopped:
+        def is_set(self):
+            return True
+
+    assert index.query("common", stop_event=Stopped()) is None
+    assert os.path.basename(index.query("t1.bat")[0].path) == "t1.bat"
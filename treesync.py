@@ -0,0 +1,24 @@
+# --- Синхронизация строк Treeview ---
+# Удаляем и добавляем только изменившиеся строки, порядок выставляем одним вызовом set_children.
+# Не зависит от customtkinter, поэтому используется и в бенчмарках.
+
+
+def sync_tree_rows(tree, old_rows, tweaks, make_row):
+    # make_row(tw) -> (values, tags); возвращает новый список iid в порядке отображения
+    new_paths = [tw.path for tw in tweaks]
+    if new_paths == old_rows:
+        return old_rows
+    new_set = set(new_paths)
+    removed = [p for p in old_rows if p not in new_set]
+    if removed:
+        tree.delete(*removed)
+    rows = [p for p in old_rows if p in new_set]
+    old_set = set(rows)
+    for tw in tweaks:
+        if tw.path not in old_set:
+            values, tags = make_row(tw)
+            tree.insert("", "end", iid=tw.path, values=values, tags=tags)
+            rows.append(tw.path)
+    if rows != new_paths:
+        tree.set_children("", *new_paths)
+    return new_paths
@@ -0,0 +1,252 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from profiler import get_profiler
+
+# --- Наблюдение за папкой твиков ---
+# На Linux используется inotify (через ctypes), в остальных случаях - периодический опрос.
+# События только помечают папки как изменённые; после паузы DEBOUNCE_SEC (но не позже MAX_DELAY_SEC
+# от первого события) помеченные папки пересканируются одним пакетом через CatalogIndex.refresh,
+# так что git pull на тысячи файлов даёт одно обновление каталога.
+
+DEBOUNCE_SEC = 0.3
+MAX_DELAY_SEC = 2.0
+POLL_INTERVAL = 3.0
+FILE_POLL_EVERY = 20  # правку файла на месте mtime папки не выдаёт - файлы сверяем раз в 20 опросов
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_ONLYDIR | IN_DONT_FOLLOW)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyBackend:
+    # Рекурсивное наблюдение: watch на каждую папку, для новых папок watch ставится сразу
+    def __init__(self, root, exts, mark):
+        import ctypes
+        import ctypes.util
+        self.root = root
+        self.exts = exts
+        self.mark = mark
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self._get_errno(), "inotify_init1")
+        self.wds = {}  # wd -> rel
+        self.rels = {}  # rel -> wd
+        if not self._watch_tree(root, "."):
+            self.close()
+            # лимит fs.inotify.max_user_watches - работаем опросом
+            raise OSError(errno.ENOSPC, "inotify watch limit reached")
+
+    def _rel(self, parent, name):
+        return os.path.normpath(os.path.join(parent, name))
+
+    def _abs(self, rel):
+        return self.root if rel == "." else os.path.join(self.root, rel)
+
+    def _watch_tree(self, abs_dir, rel):
+        # False - упёрлись в лимит watch'ей; новые события из непокрытых папок не придут
+        stack = [(abs_dir, rel)]
+        while stack:
+            abs_dir, rel = stack.pop()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(abs_dir), WATCH_MASK)
+            if wd < 0:
+                if self._get_errno() == errno.ENOSPC:
+                    return False
+                continue
+            self.wds[wd] = rel
+            self.rels[rel] = wd
+            try:
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, self._rel(rel, entry.name)))
+            except OSError:
+                continue
+        return True
+
+    def _unwatch_tree(self, rel):
+        prefix = rel + os.sep
+        for sub in [r for r in self.rels if r == rel or r.startswith(prefix)]:
+            wd = self.rels.pop(sub)
+            self.wds.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            ready, _, _ = select.select([self.fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.fd, 256 * 1024)
+            except BlockingIOError:
+                continue
+            self._dispatch(data)
+        self.close()
+
+    def _dispatch(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].split(b"\0", 1)[0])
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # очередь ядра переполнилась - события потеряны, нужна сверка всего индекса
+                self.mark(None)
+                continue
+            parent = self.wds.get(wd)
+            if mask & IN_IGNORED:
+                if parent is not None and self.rels.get(parent) == wd:
+                    del self.rels[parent]
+                self.wds.pop(wd, None)
+                continue
+            if parent is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                self.mark(parent)
+                continue
+            if mask & IN_ISDIR:
+                child = self._rel(parent, name)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(self._abs(child), child)
+                elif mask & IN_MOVED_FROM:
+                    self._unwatch_tree(child)
+                self.mark(parent)
+                self.mark(child)
+            elif name.lower().endswith(self.exts):
+                self.mark(parent)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend:
+    # Каждый опрос - только stat папок; stat каждого твика обходится дорого на больших каталогах,
+    # поэтому файлы сверяются раз в file_every опросов (и при полной сверке после потери событий)
+    def __init__(self, index, mark, interval=POLL_INTERVAL, file_every=FILE_POLL_EVERY):
+        self.index = index
+        self.mark = mark
+        self.interval = interval
+        self.file_every = max(1, file_every)
+
+    def run(self, stop_event):
+        polls = 0
+        while not stop_event.wait(self.interval):
+            polls += 1
+            for rel in self.index.changed_dirs(stop_event, files=polls % self.file_every == 0):
+                self.mark(rel)
+
+
+class CatalogWatcher:
+    # on_change({rel: tweaks}) вызывается из фонового потока - GUI передаёт данные через очередь
+    def __init__(self, index, on_change, debounce=DEBOUNCE_SEC, max_delay=MAX_DELAY_SEC,
+                 poll_interval=POLL_INTERVAL, use_inotify=None):
+        self.index = index
+        self.on_change = on_change
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self.backend = None
+        self._dirty = set()
+        self._full = False
+        self._first = None
+        self._last = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.use_inotify:
+            try:
+                self.backend = InotifyBackend(self.index.tweaks_dir, self.index.exts, self._mark)
+            except (OSError, AttributeError):
+                self.backend = None
+        if self.backend is None:
+            self.backend = PollingBackend(self.index, self._mark, self.poll_interval)
+            # при опросе события приходят раз в интервал, поэтому и "тишину" меряем интервалами
+            self.debounce = max(self.debounce, self.poll_interval * 1.5)
+            self.max_delay = max(self.max_delay, self.poll_interval * 4)
+        for target, name in ((self.backend.run, "catalog-watch"), (self._flush_loop, "catalog-refresh")):
+            thread = threading.Thread(target=target, args=(self._stop,), name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def mode(self):
+        return "inotify" if isinstance(self.backend, InotifyBackend) else "polling"
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _mark(self, rel):
+        # rel=None - события потеряны, сверяем все папки индекса
+        now = time.monotonic()
+        with self._cond:
+            if rel is None:
+                self._full = True
+            else:
+                self._dirty.add(rel)
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._cond.notify()
+
+    def _take(self, stop_event):
+        # Ждём первое событие, затем паузу debounce без новых событий (но не дольше max_delay)
+        with self._cond:
+            while self._first is None:
+                if stop_event.is_set():
+                    return None
+                self._cond.wait(0.5)
+            while not stop_event.is_set():
+                now = time.monotonic()
+                wait = min(self._last + self.debounce, self._first + self.max_delay) - now
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            dirty, full = self._dirty, self._full
+            self._dirty, self._full = set(), False
+            self._first = self._last = None
+        return dirty, full
+
+    def _flush_loop(self, stop_event):
+        while not stop_event.is_set():
+            taken = self._take(stop_event)
+            if taken is None or stop_event.is_set():
+                return
+            dirty, full = taken
+            if full:
+                dirty |= set(self.index.changed_dirs(stop_event))
+            try:
+                with get_profiler().span("catalog.refresh", "catalog", dirs=len(dirty)):
+                    changes = self.index.refresh(dirty)
+            except Exception:
+                continue
+            if changes:
+                self.on_change(changes)